@@ -1,5 +1,7 @@
-import pandas as pd  # reading the dataset
 import streamlit as st  # for GUI
+from model_registry import FEATURES  # the variables of the dataset
+from tenants import select_hospital, tenant_registry  # the dataset of every hospital
+from dataset_views import build_views, dataframe_page, page_count  # summaries of the dataset
 
 st.set_page_config(layout="wide", page_title="Gestational Diabetes Predictor")  # page layout
 
@@ -21,6 +23,9 @@ st.markdown(
 with open("main.css") as css:
     st.markdown(f"<style>{css.read()}</style>", unsafe_allow_html=True)  # connecting stylesheet
 
+# hospital whose dataset and models are used, kept when moving between the pages
+hospital = select_hospital(st)
+
 # Header
 st.markdown("<h1>Gestational Diabetes Predictor</h1>", unsafe_allow_html=True)
 st.write("<h6> By Anirudh Sengar (23001546), Suleiman Altaf (23001666), and Mohammed Abduljalil (23003266)</h6>", unsafe_allow_html=True)
@@ -81,17 +86,37 @@ st.write("The dataset consists of several medical predictor variables and one ta
          "***Outcome***. Predictor variables includes the number of pregnancies the patient has had, "
          "their BMI, insulin level, age, and so on. The training data includes reports of ***768*** women.")
 
-# Visual Representation of the Dataframe
-df = pd.read_csv("diabetes_dataset.csv")
 
-y = df["Outcome"]  # extracts the outcome variable and assigns it to 'y'
-x = df.iloc[:, 0:-1]  # selects all the columns except the last one and assigns them to 'x' which are the variables
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_dataset(hospital, dataset_key):
+    """Opens the memory-mapped copy of the hospital's dataset once and shares it with every visit,
+    'dataset_key' changes whenever the dataset does so it is only opened again then"""
+    return tenant_registry(hospital, load=False).load_dataset()
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_views(hospital, dataset_key):
+    """Computes the histograms, summary and sample of the dataset once per version of the dataset"""
+    return build_views(load_dataset(hospital, dataset_key))
+
 
+# Visual Representation of the Dataframe
+dataset_key = tenant_registry(hospital, load=False).dataset_key()
+df = load_dataset(hospital, dataset_key)
+views = load_views(hospital, dataset_key)
+
+# only one page of the dataframe is sent to the browser, however large the dataset gets
 st.markdown("##### _Dataframe_ ")
-st.dataframe(df, width=1500)
+pages = page_count(views["rows"])
+page = st.number_input(f"Page (of {pages}, {views['rows']} reports)", min_value=1, max_value=pages)
+st.dataframe(dataframe_page(df, page), width=1500)
+
 st.markdown("##### _Graphical Representation_ ")
-chart1 = st.bar_chart(df)  # bar chart
-chart2 = st.scatter_chart(df)  # scatter chart
+st.dataframe(views["summary"], width=1500)  # mean and median of every variable by outcome
+
+feature = st.selectbox("Variable", FEATURES)
+chart1 = st.bar_chart(views["histograms"][feature])  # histogram of the variable by outcome
+chart2 = st.scatter_chart(views["sample"], x="Glucose", y="BMI", color="Outcome")  # sample of the patients
 
 # Drawbacks that we are currently facing in making the model
 st.markdown("##### _Limitations_")
@@ -0,0 +1,24 @@
+import contextlib
+import os
+import threading
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w", **kwargs):
+    """Function that opens a temporary file next to 'path' for writing and, once the block is done, replaces
+    'path' with it in one step, so that no other thread or process ever reads the file half written and a
+    crash never leaves one behind. If the block raises, 'path' is left as it was.
+
+        with atomic_write("models/registry.pkl", "wb") as f:
+            pickle.dump(saved, f)"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # every thread writes its own temporary file
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,110 @@
+import argparse  # command line interface
+from collections import Counter
+
+import pandas as pd  # Reading the data and preparing it for analysis
+
+from model_registry import MODEL_FEATURES  # columns of every model
+from preprocessing import preprocess  # missing values and physiological ranges
+from risk_bands import RISK_BANDS, risk_bands  # the 4 categories of the prediction
+from tenants import DEFAULT_HOSPITAL, tenant_registry  # datasets and models of every hospital
+
+DEFAULT_CHUNKSIZE = 100_000  # rows scored at a time, keeps the memory use bounded for very large files
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Function that reads a CSV or Parquet file of patients in chunks of at most 'chunksize' rows"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq  # only needed for Parquet files
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+class _ChunkWriter:
+    """Writes the scored chunks one after the other to a CSV or Parquet file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._csv = None
+        self._parquet = None
+        self._schema = None
+
+    def write(self, chunk):
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._schema = table.schema
+                self._parquet = pq.ParquetWriter(self.path, self._schema)
+            self._parquet.write_table(table.cast(self._schema))  # CSV chunks may infer different dtypes
+        else:
+            if self._csv is None:
+                self._csv = open(self.path, "w", newline="")
+                chunk.to_csv(self._csv, index=False)
+            else:
+                chunk.to_csv(self._csv, index=False, header=False)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._csv is not None:
+            self._csv.close()
+
+
+def score_chunk(chunk, clf, cols, medians):
+    """Function that adds the predicted value, the category and the preprocessing flags of every
+    patient in the chunk"""
+    missing = [col for col in cols if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing the columns: {', '.join(missing)}")
+
+    values, _, flags = preprocess(chunk[cols].to_numpy(), cols, medians)
+    pred = clf.predict(values)  # one vectorized prediction for the whole chunk
+    chunk = chunk.copy()
+    chunk["Prediction"] = pred
+    chunk["RiskBand"] = risk_bands(pred)
+    chunk["Flags"] = flags
+    return chunk
+
+
+def score_file(input_path, output_path, model="automatic", chunksize=DEFAULT_CHUNKSIZE, hospital=DEFAULT_HOSPITAL):
+    """Function that scores every patient of the input file with the model of the hospital and writes the
+    results to the output file. Returns the number of patients in each category."""
+    _, models, medians = tenant_registry(hospital).snapshot()  # the model and the medians of the same version
+    clf = models[model]
+    cols = MODEL_FEATURES[model]
+
+    counts = Counter({band: 0 for band in RISK_BANDS})
+    writer = _ChunkWriter(output_path)
+    try:
+        for chunk in read_chunks(input_path, chunksize):
+            scored = score_chunk(chunk, clf, cols, medians)
+            counts.update(scored["RiskBand"].value_counts().to_dict())
+            writer.write(scored)
+    finally:
+        writer.close()
+    return dict(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet file of patients in bulk.")
+    parser.add_argument("input", help="CSV or Parquet file with the Pregnancies...Age columns")
+    parser.add_argument("output", help="CSV or Parquet file the predictions are written to")
+    parser.add_argument("--model", choices=sorted(MODEL_FEATURES), default="automatic",
+                        help="'automatic' uses all 8 variables, 'manual' the 5 common metrics")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows scored at a time")
+    parser.add_argument("--hospital", default=DEFAULT_HOSPITAL, help="hospital whose model is used")
+    args = parser.parse_args(argv)
+
+    counts = score_file(args.input, args.output, model=args.model, chunksize=args.chunksize,
+                        hospital=args.hospital)
+    for band in RISK_BANDS:
+        print(f"{band}: {counts[band]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Comparison of the model backends (model_backends.BACKENDS) on a held-out split of the dataset.
+
+The dataset, or a synthetic one bootstrapped from it, is split 75/25 keeping the share of diabetic
+patients. Both sides are preprocessed like the rows of the models the app serves, with the medians of
+the training rows (see preprocessing.preprocess), and for every backend and every model of
+MODEL_FEATURES it reports:
+
+    fit_s             time taken to fit the training rows
+    fit_peak_mb       peak memory while fitting, traced with tracemalloc
+    size_kb           size of the pickled model
+    predict_single    latency of predicting one patient, the way the pages do
+    predict_batch     latency of predicting every test row with one call
+    rmse              root mean squared error of the score against the outcome
+    accuracy          share of test patients whose score is on the right side of 0.5
+    auc               area under the ROC curve of the score
+
+    python benchmarks/compare_backends.py
+    python benchmarks/compare_backends.py --rows 100000 --backends linear numpy --output backends.json
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hot_paths import measure, synthetic_dataset  # noqa: E402
+from evaluation import score_metrics  # noqa: E402
+from model_backends import BACKENDS, make_model  # noqa: E402
+from model_registry import MODEL_FEATURES, TARGET  # noqa: E402
+from preprocessing import compute_medians, preprocess  # noqa: E402
+
+TEST_SIZE = 0.25  # the 75/25 split of the README
+
+
+def split(df, test_size=TEST_SIZE, seed=0):
+    """Function that returns the training and test rows, with the same share of diabetic patients in both"""
+    rng = np.random.default_rng(seed)
+    outcome = df[TARGET].to_numpy()
+    test = []
+    for value in np.unique(outcome):
+        rows = np.flatnonzero(outcome == value)
+        test.append(rng.choice(rows, size=round(len(rows) * test_size), replace=False))
+    is_test = np.zeros(len(df), dtype=bool)
+    is_test[np.concatenate(test)] = True
+    return df[~is_test].reset_index(drop=True), df[is_test].reset_index(drop=True)
+
+
+def bench_backend(backend, train, test, single_repeats, batch_repeats):
+    """Function that fits and measures one backend for every model of MODEL_FEATURES"""
+    results = {}
+    y = test[TARGET].to_numpy()
+    medians = compute_medians(train)  # of the training rows only, the test rows are never looked at
+    make_model(backend)  # imports the libraries of the backend, so that it isn't counted as fitting time
+    for name, cols in MODEL_FEATURES.items():
+        X_train, _, _ = preprocess(train[cols].to_numpy(), cols, medians)
+        y_train = train[TARGET].to_numpy()
+        X_test, _, _ = preprocess(test[cols].to_numpy(), cols, medians)
+
+        start = time.perf_counter()
+        clf = make_model(backend).fit(X_train, y_train)
+        fit_s = time.perf_counter() - start
+
+        tracemalloc.start()
+        make_model(backend).fit(X_train, y_train)
+        fit_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        score = np.asarray(clf.predict(X_test), dtype=float)
+        patient = X_test[:1]
+        results[name] = {
+            "fit_s": fit_s,
+            "fit_peak_mb": fit_peak / 1e6,
+            "size_kb": len(pickle.dumps(clf)) / 1e3,
+            "predict_single": measure(lambda: clf.predict(patient), single_repeats),
+            "predict_batch": measure(lambda: clf.predict(X_test), batch_repeats, len(X_test)),
+            **score_metrics(y, score),
+        }
+    return results
+
+
+def run(backends, rows=None, single_repeats=1000, batch_repeats=20, seed=0):
+    import pandas as pd
+
+    df = synthetic_dataset(rows, seed) if rows else pd.read_csv(os.path.join(ROOT, "diabetes_dataset.csv"))
+    train, test = split(df, seed=seed)
+    results = {"python": sys.version.split()[0], "rows": len(df), "train_rows": len(train),
+               "test_rows": len(test), "backends": {}}
+    for backend in backends:
+        print(f"{backend}...", file=sys.stderr)
+        results["backends"][backend] = bench_backend(backend, train, test, single_repeats, batch_repeats)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the model backends on a 75/25 split of the dataset.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--rows", type=int, help="rows of a synthetic dataset used instead of the real one")
+    parser.add_argument("--single-repeats", type=int, default=1000, help="runs of the single patient prediction")
+    parser.add_argument("--batch-repeats", type=int, default=20, help="runs of the whole test set prediction")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    results = run(args.backends, args.rows, args.single_repeats, args.batch_repeats)
+    print(f"{results['train_rows']} training rows, {results['test_rows']} test rows")
+    for backend, models in results["backends"].items():
+        for name, r in models.items():
+            print(f"{backend:<9} {name:<10} fit {r['fit_s'] * 1000:9.1f}ms  peak {r['fit_peak_mb']:7.1f}MB  "
+                  f"size {r['size_kb']:8.1f}kB  single p50 {r['predict_single']['p50_ms']:7.3f}ms  "
+                  f"batch p50 {r['predict_batch']['p50_ms']:8.3f}ms  rmse {r['rmse']:.4f}  "
+                  f"accuracy {r['accuracy']:.3f}  auc {r['auc']:.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
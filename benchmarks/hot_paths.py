@@ -0,0 +1,222 @@
+"""Benchmarks of the training, prediction and PDF extraction hot paths.
+
+Every stage is timed on synthetic datasets bootstrapped from diabetes_dataset.csv, from the original
+768 rows up to millions, and reported with latency percentiles, throughput and peak memory:
+
+    csv_load          reading the dataset CSV
+    columnar_load     opening the memory-mapped columnar copy of the dataset and summing every column
+    fit               fitting the 8 and 5 variable models (model_registry.train_models)
+    preprocess        imputing and clipping the whole dataset (preprocessing.preprocess)
+    predict_single    predicting one preprocessed patient, the way the pages do
+    predict_batch     predicting the whole preprocessed dataset with one call
+    pdf_parse         extracting the values of the "Medical Reports" samples with tabula
+    request_automatic the automatic page's path for an already seen report: cache, dataframe, model snapshot,
+                      preprocess, predict, category
+    request_manual    the manual page's path: dataframe, missing values check, preprocess, prediction cache
+                      (filled by the first 1000 patients, then hit)
+
+The models are those of a model registry of the synthetic dataset, as on the pages.
+
+Results can be saved to JSON and compared with an earlier run:
+
+    python benchmarks/hot_paths.py --sizes 768 100000 1000000 --output hot_paths.json
+    python benchmarks/hot_paths.py --baseline hot_paths.json
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from columnar_dataset import load_frame, write_columns  # noqa: E402
+from model_registry import FEATURES, MANUAL_FEATURES, MODEL_CHECK_INTERVAL, ModelRegistry, train_models  # noqa: E402
+from prediction_cache import PredictionCache  # noqa: E402
+from preprocessing import missing_columns, missing_mask, preprocess  # noqa: E402
+from report_cache import ReportCache, report_key  # noqa: E402
+from report_ingest import extract_report, read_report  # noqa: E402
+from risk_bands import risk_band  # noqa: E402
+
+DEFAULT_SIZES = [768, 10_000, 100_000, 1_000_000]
+REPORTS_DIR = os.path.join(ROOT, "Medical Reports")
+
+
+def synthetic_dataset(rows, seed=0):
+    """Function that returns 'rows' patients drawn from the real dataset with a little noise added,
+    rounded the same way as the original columns"""
+    base = pd.read_csv(os.path.join(ROOT, "diabetes_dataset.csv"))
+    if rows == len(base):
+        return base
+
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    for col in FEATURES:
+        noise = rng.normal(0, base[col].std() * 0.05, rows)
+        values = np.clip(df[col].to_numpy(dtype=float) + noise, 0, None)
+        df[col] = values.round(3) if base[col].dtype.kind == "f" else values.round().astype(base[col].dtype)
+    return df
+
+
+def measure(func, repeats, rows=1):
+    """Function that runs 'func' 'repeats' times and returns its latency percentiles, throughput in rows
+    per second and the peak memory of one extra run traced with tracemalloc"""
+    func()  # warm up
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    return {
+        "repeats": repeats,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "throughput_rows_s": float(rows * repeats / latencies.sum()),
+        "peak_memory_mb": peak / 1e6,
+    }
+
+
+def bench_dataset(rows, repeats, single_repeats, workdir):
+    """Function that benchmarks every stage that depends on the size of the dataset"""
+    df = synthetic_dataset(rows)
+    path = os.path.join(workdir, f"dataset_{rows}.csv")
+    df.to_csv(path, index=False)
+    columnar = os.path.join(workdir, f"dataset_{rows}")
+    write_columns(df, columnar)
+
+    # the models, and the medians they were trained with, the way the pages get them
+    registry = ModelRegistry(dataset_path=path, model_dir=os.path.join(workdir, f"models_{rows}"),
+                             columnar_dir=os.path.join(workdir, f"dataset_cache_{rows}"),
+                             check_interval=MODEL_CHECK_INTERVAL)
+    _, models, medians = registry.snapshot()
+    X, _, _ = preprocess(df[FEATURES].to_numpy(), FEATURES, medians)
+
+    # the automatic page's path for a report that is already in the cache
+    cache = ReportCache(directory=None)
+    pdf_bytes = b"%PDF benchmark report"
+    cache.put(report_key(pdf_bytes), df[FEATURES].iloc[0].tolist())
+
+    def request_automatic():
+        data = pd.DataFrame([read_report(pdf_bytes, cache=cache)], columns=FEATURES)
+        _, models, medians = registry.snapshot()
+        values, _, _ = preprocess(data.to_numpy(), FEATURES, medians)
+        risk_band(models["automatic"].predict(values))
+
+    # the manual page's path for patients with every value entered, the page predicts nothing otherwise
+    manual = df[MANUAL_FEATURES].to_numpy()
+    complete = manual[~missing_mask(manual, MANUAL_FEATURES).any(axis=1)][:1000]
+    patients = itertools.cycle(complete.tolist())
+    predictions = PredictionCache()
+
+    def request_manual():
+        information = next(patients)
+        pd.DataFrame([information], columns=MANUAL_FEATURES)
+        if not missing_columns(information, MANUAL_FEATURES):
+            values, _, _ = preprocess(information, MANUAL_FEATURES, registry.feature_medians())
+            predictions.predict(registry, "manual", values[0])
+
+    return {
+        "csv_load": measure(lambda: pd.read_csv(path), repeats, rows),
+        "columnar_load": measure(lambda: load_frame(columnar).sum(), repeats, rows),
+        "fit": measure(lambda: train_models(df), repeats, rows),
+        "preprocess": measure(lambda: preprocess(df[FEATURES].to_numpy(), FEATURES, medians), repeats, rows),
+        "predict_single": measure(lambda: models["automatic"].predict(X[:1]), single_repeats),
+        "predict_batch": measure(lambda: models["automatic"].predict(X), repeats, rows),
+        "request_automatic": measure(request_automatic, single_repeats),
+        "request_manual": measure(request_manual, single_repeats),
+    }
+
+
+def bench_pdf(repeats):
+    """Function that benchmarks the tabula extraction of the sample reports, or says why it can't run"""
+    reports = sorted(name for name in os.listdir(REPORTS_DIR) if name.lower().endswith(".pdf"))
+    paths = [os.path.join(REPORTS_DIR, name) for name in reports]
+    try:
+        extract_report(paths[0])
+    except Exception as error:
+        return {"skipped": f"{type(error).__name__}: {error}"}
+
+    def parse_all():
+        for path in paths:
+            extract_report(path)
+
+    result = measure(parse_all, repeats, rows=len(paths))
+    result["reports"] = len(paths)
+    return result
+
+
+def run(sizes, repeats=5, single_repeats=1000, pdf_repeats=3):
+    results = {"python": sys.version.split()[0], "sizes": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes:
+            print(f"dataset of {rows} rows...", file=sys.stderr)
+            results["sizes"][str(rows)] = bench_dataset(rows, repeats, single_repeats, workdir)
+    print("PDF reports...", file=sys.stderr)
+    results["pdf_parse"] = bench_pdf(pdf_repeats)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Function that returns the stages whose median latency got slower than the baseline by more than 'tolerance'"""
+    regressions = []
+    for size, stages in results["sizes"].items():
+        for stage, timings in stages.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(stage)
+            if before and timings["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+                regressions.append(f"{size} rows {stage}: {before['p50_ms']:.3f}ms -> {timings['p50_ms']:.3f}ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the training, prediction and PDF extraction hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="rows of the synthetic datasets")
+    parser.add_argument("--repeats", type=int, default=5, help="runs of the whole dataset stages")
+    parser.add_argument("--single-repeats", type=int, default=1000, help="runs of the single patient stages")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before it is reported")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeats, args.single_repeats)
+    for size, stages in results["sizes"].items():
+        print(f"{size} rows")
+        for stage, t in stages.items():
+            print(f"  {stage:<18} p50 {t['p50_ms']:10.3f}ms  p95 {t['p95_ms']:10.3f}ms  p99 {t['p99_ms']:10.3f}ms  "
+                  f"{t['throughput_rows_s']:14.0f} rows/s  peak {t['peak_memory_mb']:8.1f}MB")
+    pdf = results["pdf_parse"]
+    if "skipped" in pdf:
+        print(f"pdf_parse skipped: {pdf['skipped']}")
+    else:
+        print(f"pdf_parse ({pdf['reports']} reports) p50 {pdf['p50_ms']:.1f}ms  "
+              f"{pdf['throughput_rows_s']:.1f} reports/s  peak {pdf['peak_memory_mb']:.1f}MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Cold start benchmark of the Streamlit pages.
+
+Every page is rendered in a fresh Python process, the way an autoscaled container starts, and the time
+to import streamlit, the time of the first render (which includes importing everything the page needs)
+and the time of a rerun are recorded. Results can be saved to JSON and compared with an earlier run:
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --baseline startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["Home_Page.py", "pages/Automatic_Prediction.py", "pages/Manual_Prediction.py"]
+
+# modules that are slow to import. The app imports them inside the functions that use them, never at the top
+# of a module the pages import, so a page only pays for them on the code paths that need them
+HEAVY_MODULES = ["pandas", "pyarrow", "sklearn", "tabula", "jpype"]
+
+# runs inside the fresh process
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+modules = set(sys.modules)
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.run()
+rendered = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({
+    "streamlit_import_s": imported - start,
+    "first_render_s": rendered - imported,
+    "rerun_s": rerun - rendered,
+    "modules_loaded": len(set(sys.modules) - modules),
+    "heavy_modules": [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+    "exceptions": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def measure_page(page, python=sys.executable):
+    """Function that renders the page once in a fresh process and returns its timings"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([python, "-c", _PROBE, os.path.join(ROOT, page), json.dumps(HEAVY_MODULES)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeats=5):
+    """Function that measures every page 'repeats' times and returns the median of each timing"""
+    results = {}
+    for page in PAGES:
+        runs = [measure_page(page) for _ in range(repeats)]
+        results[page] = {
+            key: statistics.median(run[key] for run in runs)
+            for key in ("streamlit_import_s", "first_render_s", "rerun_s", "modules_loaded")
+        }
+        results[page]["heavy_modules"] = runs[-1]["heavy_modules"]
+        results[page]["exceptions"] = runs[-1]["exceptions"]
+    return {"python": sys.version.split()[0], "repeats": repeats, "pages": results}
+
+
+def compare(results, baseline, tolerance):
+    """Function that returns the timings that got slower than the baseline by more than 'tolerance'"""
+    regressions = []
+    for page, timings in results["pages"].items():
+        before = baseline["pages"].get(page)
+        if before is None:
+            continue
+        for key in ("first_render_s", "rerun_s"):
+            if timings[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{page} {key}: {before[key]:.3f}s -> {timings[key]:.3f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start of every Streamlit page.")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh processes per page")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before it is reported")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeats)
+    for page, timings in results["pages"].items():
+        print(f"{page}: import streamlit {timings['streamlit_import_s']:.3f}s, "
+              f"first render {timings['first_render_s']:.3f}s, rerun {timings['rerun_s']:.3f}s, "
+              f"heavy modules {', '.join(timings['heavy_modules']) or 'none'}")
+        for error in timings["exceptions"]:
+            print(f"  exception: {error}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Load test of the per-hospital models (tenants.TenantCache) as the number of hospitals grows.
+
+For every hospital count a fresh set of hospitals is created in a temporary folder, each with its own
+synthetic dataset, and their models are trained once. Requests then pick a hospital with a skewed
+(Zipf) popularity, as a few large hospitals send most of the traffic, and predict one patient with
+its model from concurrent threads. The memory budget only holds part of the hospitals, so the least
+used ones are evicted and read back from disk. Latency percentiles, cache hits and evictions are
+reported for every count; the latency should stay flat as the count grows:
+
+    python benchmarks/tenant_load.py --tenants 10 100 200 400 --budget-tenants 50
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hot_paths import synthetic_dataset  # noqa: E402
+from model_registry import MANUAL_FEATURES  # noqa: E402
+from risk_bands import risk_band  # noqa: E402
+from tenants import TenantCache, create_hospital, models_size  # noqa: E402
+
+DEFAULT_TENANTS = [10, 50, 100, 200, 400]
+
+
+def make_hospitals(count, rows, hospitals_dir, seed=0):
+    """Function that creates 'count' hospitals, each with its own synthetic dataset, and trains their models"""
+    cache = TenantCache(memory_budget=float("inf"), hospitals_dir=hospitals_dir)
+    ids = [f"hospital-{i:04d}" for i in range(count)]
+    start = time.perf_counter()
+    for i, hospital_id in enumerate(ids):
+        create_hospital(hospital_id, synthetic_dataset(rows, seed + i), hospitals_dir)
+        cache.get(hospital_id)  # trains and saves the models
+    size = models_size(cache.get(ids[0]).models)
+    return ids, size, time.perf_counter() - start
+
+
+def run_load(ids, cache, requests, threads, zipf=1.2, seed=0):
+    """Function that sends 'requests' single patient predictions spread over the hospitals and returns
+    the latency of every request in seconds"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(ids) + 1) ** zipf
+    picks = rng.choice(len(ids), size=requests, p=weights / weights.sum())
+    patients = rng.uniform([0, 80, 50, 18, 21], [10, 200, 100, 45, 70], size=(requests, len(MANUAL_FEATURES)))
+
+    def request(i):
+        start = time.perf_counter()
+        clf = cache.get(ids[picks[i]]).get("manual")
+        risk_band(clf.predict(patients[i:i + 1]))
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return np.array(list(pool.map(request, range(requests))))
+
+
+def run(tenant_counts, budget_tenants=50, rows=1000, requests=20_000, threads=8):
+    results = {"python": sys.version.split()[0], "budget_tenants": budget_tenants, "tenants": {}}
+    for count in tenant_counts:
+        with tempfile.TemporaryDirectory() as hospitals_dir:
+            print(f"{count} hospitals...", file=sys.stderr)
+            ids, size, setup_s = make_hospitals(count, rows, hospitals_dir)
+
+            cache = TenantCache(memory_budget=size * budget_tenants, hospitals_dir=hospitals_dir)
+            run_load(ids, cache, min(1000, requests), threads)  # warm up
+            warm = cache.stats()
+            latencies = run_load(ids, cache, requests, threads, seed=1)
+            stats = cache.stats()
+
+            results["tenants"][str(count)] = {
+                "setup_s": setup_s,
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p95_ms": float(np.percentile(latencies, 95) * 1000),
+                "p99_ms": float(np.percentile(latencies, 99) * 1000),
+                "hit_rate": (stats["hits"] - warm["hits"]) / requests,
+                "evictions": stats["evictions"] - warm["evictions"],
+                "tenants_in_memory": stats["tenants"],
+                "memory_used_kb": stats["memory_used"] / 1e3,
+                "memory_budget_kb": stats["memory_budget"] / 1e3,
+            }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the per-hospital models as the hospital count grows.")
+    parser.add_argument("--tenants", type=int, nargs="+", default=DEFAULT_TENANTS, help="hospital counts tested")
+    parser.add_argument("--budget-tenants", type=int, default=50, help="memory budget, in hospitals' models")
+    parser.add_argument("--rows", type=int, default=1000, help="rows of every hospital's dataset")
+    parser.add_argument("--requests", type=int, default=20_000, help="requests sent for every count")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    results = run(args.tenants, args.budget_tenants, args.rows, args.requests, args.threads)
+    for count, r in results["tenants"].items():
+        print(f"{count:>5} hospitals  p50 {r['p50_ms']:7.3f}ms  p95 {r['p95_ms']:7.3f}ms  p99 {r['p99_ms']:8.3f}ms  "
+              f"hits {r['hit_rate']:6.1%}  evictions {r['evictions']:6d}  in memory {r['tenants_in_memory']:4d}  "
+              f"{r['memory_used_kb']:8.1f}/{r['memory_budget_kb']:.1f}kB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
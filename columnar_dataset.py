@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from atomic_files import atomic_write  # the pointer is switched in one step
+
+COLUMNAR_DIR = "dataset_cache"
+POINTER_NAME = "CURRENT"  # file in COLUMNAR_DIR naming the folder of the current version
+KEEP_VERSIONS = 2  # versions kept on disk, so a reader that has just read the pointer can still open the previous one
+
+# narrowest types tried for columns that only hold whole numbers, in order
+_INTEGER_TYPES = [np.uint8, np.uint16, np.uint32, np.int8, np.int16, np.int32, np.int64]
+
+
+def narrow_dtype(values):
+    """Function that returns the smallest type that holds the column: the smallest integer type for
+    columns of whole numbers, which are kept exactly, and float32 for columns with decimals such as BMI,
+    which keeps about 7 significant digits"""
+    values = np.asarray(values)
+    if values.size == 0:
+        return np.dtype(np.uint8)
+    if values.dtype.kind == "f" and not (np.isfinite(values).all() and (values == np.round(values)).all()):
+        return np.dtype(np.float32)
+
+    low, high = values.min(), values.max()
+    for dtype in _INTEGER_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.float64)
+
+
+def write_columns(df, directory, meta=None):
+    """Function that saves every column of the dataframe as its own .npy file with the narrowest type,
+    together with a meta.json listing the columns. The folder is written under a temporary name and
+    renamed once complete, so readers never see it half written. 'directory' must not be in use:
+    publish_columns() gives every version of a dataset its own folder."""
+    tmp = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = {}
+    for col in df.columns:
+        values = df[col].to_numpy()
+        dtype = narrow_dtype(values)
+        np.save(os.path.join(tmp, f"{col}.npy"), values.astype(dtype))
+        columns[col] = dtype.name
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(dict(meta or {}, rows=len(df), columns=columns), f)
+
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another process has just written the same copy
+
+
+def current_columns(root):
+    """Function that returns the folder of the version named by the pointer file of 'root', or None"""
+    try:
+        with open(os.path.join(root, POINTER_NAME)) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(root, name) if name else None
+
+
+def publish_columns(df, root, name, meta=None, keep=KEEP_VERSIONS):
+    """Function that writes a version of the dataset to root/<name>, unless it is already there, and makes
+    it the current one by replacing the pointer file in one step. Readers in other processes keep using
+    the folder they found until they read the pointer again, so no folder is ever changed under them.
+    The oldest versions are removed afterwards, 'keep' of them are left. Returns the folder."""
+    directory = os.path.join(root, name)
+    if read_meta(directory) is None:
+        write_columns(df, directory, meta)
+
+    with atomic_write(os.path.join(root, POINTER_NAME)) as f:
+        f.write(name)
+
+    _remove_old_versions(root, keep)
+    return directory
+
+
+def _remove_old_versions(root, keep):
+    current = current_columns(root)
+    versions = []
+    for entry in os.scandir(root):
+        # folders still being written by another process end in .tmp and are left to it
+        if entry.is_dir() and not entry.name.endswith(".tmp") and entry.path != current:
+            versions.append((entry.stat().st_mtime, entry.path))
+    for _, path in sorted(versions, reverse=True)[max(keep - 1, 0):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_meta(directory):
+    """Function that returns the meta.json of a columnar copy, or None if there isn't a complete one"""
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_columns(directory):
+    """Function that returns every column of a columnar copy as a read-only memory-mapped array,
+    nothing is read from disk until the values are used"""
+    meta = read_meta(directory)
+    if meta is None:
+        raise FileNotFoundError(f"No columnar dataset in {directory}")
+    return {col: np.load(os.path.join(directory, f"{col}.npy"), mmap_mode="r") for col in meta["columns"]}
+
+
+def load_frame(directory):
+    """Function that returns a dataframe whose columns are the memory-mapped arrays, without copying them"""
+    import pandas as pd
+
+    return pd.DataFrame(load_columns(directory), copy=False)
@@ -0,0 +1,73 @@
+import numpy as np
+
+from model_registry import FEATURES, TARGET
+
+HISTOGRAM_BINS = 20
+SAMPLE_SIZE = 2000  # points drawn on the scatter chart, whatever the size of the dataset
+PAGE_SIZE = 100  # rows of the dataframe shown at a time
+
+OUTCOME_LABELS = {0: "Non-Diabetic", 1: "Diabetic"}
+
+
+def feature_histograms(df, bins=HISTOGRAM_BINS):
+    """Function that returns, for every variable, a dataframe with the number of non-diabetic and
+    diabetic patients in each of 'bins' equal width ranges of the variable"""
+    import pandas as pd
+
+    outcome = df[TARGET].to_numpy()
+    histograms = {}
+    for col in FEATURES:
+        values = df[col].to_numpy(dtype=float)
+        edges = np.histogram_bin_edges(values, bins=bins)
+        counts = {label: np.histogram(values[outcome == value], bins=edges)[0]
+                  for value, label in OUTCOME_LABELS.items()}
+        index = pd.Index(np.round(edges[:-1], 3), name=col)  # left edge of every range
+        histograms[col] = pd.DataFrame(counts, index=index)
+    return histograms
+
+
+def outcome_summary(df):
+    """Function that returns the number of patients and the mean and median of every variable,
+    for the non-diabetic and the diabetic patients"""
+    grouped = df.groupby(TARGET)[FEATURES]
+    summary = grouped.agg(["mean", "median"]).T.rename(columns=OUTCOME_LABELS)
+    summary.loc[("Patients", "count"), :] = df[TARGET].value_counts().rename(OUTCOME_LABELS)
+    return summary.round(3)
+
+
+def stratified_sample(df, size=SAMPLE_SIZE, seed=0):
+    """Function that returns at most 'size' rows of the dataset, keeping the share of diabetic and
+    non-diabetic patients of the whole dataset"""
+    if len(df) <= size:
+        return df
+
+    rng = np.random.default_rng(seed)
+    outcome = df[TARGET].to_numpy()
+    picked = []
+    for value in np.unique(outcome):
+        rows = np.flatnonzero(outcome == value)
+        take = max(1, round(size * len(rows) / len(df)))
+        picked.append(rng.choice(rows, size=min(take, len(rows)), replace=False))
+    return df.iloc[np.sort(np.concatenate(picked))]
+
+
+def build_views(df):
+    """Function that precomputes everything the home page shows about the dataset, so that the size
+    of the page doesn't grow with the dataset"""
+    return {
+        "rows": len(df),
+        "histograms": feature_histograms(df),
+        "summary": outcome_summary(df),
+        "sample": stratified_sample(df),
+    }
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    """Function that returns the number of pages needed to show 'rows' rows"""
+    return max(1, -(-rows // page_size))
+
+
+def dataframe_page(df, page, page_size=PAGE_SIZE):
+    """Function that returns the rows shown on the given page, counting from 1"""
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
@@ -0,0 +1,200 @@
+import argparse  # command line interface
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+
+from atomic_files import atomic_write  # the report is never read half written
+from model_backends import BACKENDS, MODEL_BACKEND, make_model  # the type of model evaluated
+from model_registry import FEATURES, MANUAL_FEATURES, MODEL_DIR, TARGET, dataset_hash, registry
+from preprocessing import compute_medians, preprocess  # missing values and physiological ranges
+
+DEFAULT_FOLDS = 5
+REPORT_FORMAT = 2  # changed whenever the way the models are evaluated changes, so older cached reports aren't used
+
+# the feature sets used by the pages, always part of the report
+NAMED_SUBSETS = {
+    "automatic": FEATURES,
+    "manual": MANUAL_FEATURES,
+}
+
+
+def stratified_folds(y, k=DEFAULT_FOLDS, seed=0):
+    """Function that splits the row numbers into k test folds, each with the same share of diabetic patients"""
+    rng = np.random.default_rng(seed)
+    folds = [[] for _ in range(k)]
+    for value in np.unique(y):
+        rows = rng.permutation(np.flatnonzero(y == value))
+        for i, part in enumerate(np.array_split(rows, k)):
+            folds[i].append(part)
+    return [np.sort(np.concatenate(parts)) for parts in folds]
+
+
+def roc_auc(y, score):
+    """Function that returns the area under the ROC curve, the chance that a diabetic patient scores higher
+    than a non-diabetic one (ties count as half)"""
+    positives = y == 1
+    n_pos, n_neg = positives.sum(), (~positives).sum()
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+    # average rank of every score, tied scores share the same rank
+    _, inverse, counts = np.unique(score, return_inverse=True, return_counts=True)
+    upper = np.cumsum(counts)
+    ranks = (upper - (counts - 1) / 2)[inverse]
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+def score_metrics(y, score):
+    """Function that returns the RMSE, accuracy (score on the right side of 0.5) and AUC of the scores"""
+    return {
+        "rmse": float(np.sqrt(np.mean((score - y) ** 2))),
+        "accuracy": float(np.mean((score >= 0.5) == (y == 1))),
+        "auc": roc_auc(y, score),
+    }
+
+
+def _evaluate_fold(X, y, test, backend, cols):
+    """Fits the model on every row outside of the test fold and scores the rows inside it, both preprocessed
+    with the medians of the training rows like the models the pages use"""
+    is_test = np.zeros(len(y), dtype=bool)
+    is_test[test] = True
+    medians = compute_medians(dict(zip(cols, X[~is_test].T)))
+    X_train, _, _ = preprocess(X[~is_test], cols, medians)
+    X_test, _, _ = preprocess(X[is_test], cols, medians)
+    clf = make_model(backend).fit(X_train, y[~is_test])
+    return score_metrics(y[is_test], np.asarray(clf.predict(X_test), dtype=float))
+
+
+def feature_subsets(min_size=1, max_size=None):
+    """Function that returns every subset of FEATURES with between min_size and max_size variables,
+    plus the automatic and manual sets, as a dict of name -> columns"""
+    max_size = len(FEATURES) if max_size is None else max_size
+    subsets = {name: list(cols) for name, cols in NAMED_SUBSETS.items()}
+    for size in range(min_size, max_size + 1):
+        for cols in itertools.combinations(FEATURES, size):
+            if list(cols) not in subsets.values():
+                subsets["+".join(cols)] = list(cols)
+    return subsets
+
+
+def cross_validate(df, subsets, backend=MODEL_BACKEND, k=DEFAULT_FOLDS, seed=0, n_jobs=-1):
+    """Function that runs k-fold cross-validation of every feature subset, with every fold of every
+    subset fitted in parallel on all the cores. Returns the mean and standard deviation of the RMSE,
+    accuracy and AUC of every subset."""
+    from joblib import Parallel, delayed  # comes with scikit-learn, only needed for evaluating
+
+    y = df[TARGET].to_numpy(dtype=float)
+    X = df[FEATURES].to_numpy(dtype=float)
+    folds = stratified_folds(y, k, seed)
+    position = {col: i for i, col in enumerate(FEATURES)}
+
+    tasks = [(name, fold) for name in subsets for fold in folds]
+    # large arrays are memory-mapped by joblib rather than copied into every worker
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_evaluate_fold)(X[:, [position[col] for col in subsets[name]]], y, fold, backend, subsets[name])
+        for name, fold in tasks)
+
+    results = {}
+    for (name, _), fold_scores in zip(tasks, scores):
+        results.setdefault(name, []).append(fold_scores)
+
+    report = {}
+    for name, fold_scores in results.items():
+        summary = {"features": subsets[name]}
+        for metric in fold_scores[0]:
+            values = np.array([s[metric] for s in fold_scores])
+            summary[metric] = {"mean": float(values.mean()), "std": float(values.std())}
+        report[name] = summary
+    return report
+
+
+def evaluate(df, version, backend=MODEL_BACKEND, k=DEFAULT_FOLDS, seed=0, search=True, n_jobs=-1):
+    """Function that returns the evaluation report of a dataset: the cross-validated automatic and manual
+    feature sets and, if 'search' is True, every other subset of the variables ranked by RMSE"""
+    subsets = feature_subsets() if search else {name: list(cols) for name, cols in NAMED_SUBSETS.items()}
+    results = cross_validate(df, subsets, backend, k, seed, n_jobs)
+    ranking = sorted(results, key=lambda name: results[name]["rmse"]["mean"])
+    return {
+        "dataset_hash": version,
+        "rows": len(df),
+        "backend": backend,
+        "folds": k,
+        "seed": seed,
+        "automatic": results["automatic"],
+        "manual": results["manual"],
+        "best": {"name": ranking[0], **results[ranking[0]]},
+        "subsets": {name: results[name] for name in ranking},
+    }
+
+
+def report_path(version, backend=MODEL_BACKEND, k=DEFAULT_FOLDS, seed=0, search=True, report_dir=MODEL_DIR):
+    """Function that returns the file the report of this dataset version and these settings is cached in"""
+    key = hashlib.sha256(f"{REPORT_FORMAT}:{version}:{backend}:{k}:{seed}:{search}".encode()).hexdigest()[:16]
+    return os.path.join(report_dir, f"evaluation-{key}.json")
+
+
+def cached_evaluation(df, version, backend=MODEL_BACKEND, k=DEFAULT_FOLDS, seed=0, search=True, n_jobs=-1,
+                      report_dir=MODEL_DIR):
+    """Function that returns the evaluation report of the dataset, read from the cache if this version of
+    the dataset was already evaluated with the same settings"""
+    path = report_path(version, backend, k, seed, search, report_dir)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    report = evaluate(df, version, backend, k, seed, search, n_jobs)
+    os.makedirs(report_dir, exist_ok=True)
+    with atomic_write(path) as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def evaluate_registry(model_registry=registry, backend=None, k=DEFAULT_FOLDS, seed=0, search=True, n_jobs=-1):
+    """Function that returns the cached evaluation report of the dataset of a model registry"""
+    backend = model_registry.backend if backend is None else backend
+    return cached_evaluation(model_registry.load_dataset(), model_registry.dataset_version(), backend, k, seed,
+                             search, n_jobs, report_dir=model_registry.model_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validate the models and search the feature subsets.")
+    parser.add_argument("--dataset", help="CSV file to evaluate instead of the default dataset")
+    parser.add_argument("--backend", choices=list(BACKENDS), help="model backend, by default the configured one")
+    parser.add_argument("--folds", type=int, default=DEFAULT_FOLDS, help="number of folds")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the fold split")
+    parser.add_argument("--no-search", action="store_true", help="only evaluate the automatic and manual sets")
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel workers, -1 uses every core")
+    parser.add_argument("--top", type=int, default=10, help="subsets shown from the ranking")
+    parser.add_argument("--output", help="JSON file the report is also written to")
+    args = parser.parse_args(argv)
+
+    search = not args.no_search
+    if args.dataset:
+        import pandas as pd
+
+        backend = args.backend or MODEL_BACKEND
+        report = cached_evaluation(pd.read_csv(args.dataset), dataset_hash(args.dataset), backend, args.folds,
+                                   args.seed, search, args.jobs)
+    else:
+        report = evaluate_registry(backend=args.backend, k=args.folds, seed=args.seed, search=search,
+                                   n_jobs=args.jobs)
+
+    print(f"{report['rows']} rows, {report['folds']}-fold cross-validation, {report['backend']} backend")
+    shown = list(report["subsets"])[:args.top]
+    shown += [name for name in NAMED_SUBSETS if name not in shown]  # the pages' sets are always shown
+    for name in shown:
+        result = report["subsets"][name]
+        print(f"  {name:<60} rmse {result['rmse']['mean']:.4f} ±{result['rmse']['std']:.4f}  "
+              f"accuracy {result['accuracy']['mean']:.3f}  auc {result['auc']['mean']:.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
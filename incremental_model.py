@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class IncrementalLinearRegression:
+    """Multiple Linear Regression that can be updated with new rows without refitting on the whole dataset.
+
+    Only the sufficient statistics X^T X and X^T y (with a column of ones for the intercept) and the
+    number of rows are kept. Adding rows costs O(rows * features^2) and solving for the coefficients only
+    depends on the number of features, so the result is the same line-of-best-fit as a full refit."""
+
+    def __init__(self):
+        self.xtx = None
+        self.xty = None
+        self.n_samples_ = 0
+        self.n_features_in_ = None
+        self.feature_names_in_ = None
+        self.coef_ = None
+        self.intercept_ = 0.0
+
+    def fit(self, X, y):
+        """Fits the model from scratch on the given rows"""
+        self.xtx = None
+        self.xty = None
+        self.n_samples_ = 0
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        """Adds the given rows to the model and updates the coefficients"""
+        if hasattr(X, "columns") and self.feature_names_in_ is None:
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        X = self._design(X)
+        y = np.asarray(y, dtype=float).ravel()
+        if len(X) != len(y):
+            raise ValueError(f"X has {len(X)} rows but y has {len(y)}")
+
+        if self.xtx is None:
+            self.n_features_in_ = X.shape[1] - 1
+            self.xtx = np.zeros((X.shape[1], X.shape[1]))
+            self.xty = np.zeros(X.shape[1])
+        elif X.shape[1] != self.xtx.shape[0]:
+            raise ValueError(f"Expected {self.n_features_in_} features but got {X.shape[1] - 1}")
+
+        self.xtx += X.T @ X
+        self.xty += X.T @ y
+        self.n_samples_ += len(y)
+        self._solve()
+        return self
+
+    def predict(self, X):
+        """Returns the predicted value of every row"""
+        X = np.asarray(X, dtype=float)
+        return X @ self.coef_ + self.intercept_
+
+    def _design(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return np.column_stack([np.ones(len(X)), X])  # column of ones for the intercept
+
+    def _solve(self):
+        # least squares on the normal equations also copes with columns that are constant or duplicated
+        weights = np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+        self.intercept_ = float(weights[0])
+        self.coef_ = weights[1:]
@@ -0,0 +1,182 @@
+import bisect
+import cProfile
+import os
+import threading
+import time
+
+from atomic_files import atomic_write  # the metrics file is never read half written
+# settings, e.g. DIABETES_METRICS=1 DIABETES_METRICS_FILE=metrics.prom streamlit run Home_Page.py
+METRICS_ENABLED = os.environ.get("DIABETES_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("DIABETES_METRICS_FILE") or None  # Prometheus text file, e.g. for node_exporter
+PROFILE_DIR = os.environ.get("DIABETES_PROFILE_DIR") or None  # cProfile stats of every stage are saved here
+
+# upper bounds, in seconds, of the histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _NullTimer:
+    """Used when the metrics are disabled, so that timing a stage costs next to nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+# held by the thread being profiled, since Python 3.12 only one profiler can be enabled per process
+_profiler_lock = threading.Lock()
+
+
+class _Timer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.profile = None
+
+    def __enter__(self):
+        # only the outermost stage of a thread is profiled, cProfile can't be nested, and while another
+        # thread is profiled the stage is only timed
+        if (self.metrics.profile_dir is not None and not getattr(self.metrics._local, "profiling", False)
+                and _profiler_lock.acquire(blocking=False)):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                _profiler_lock.release()  # another profiling tool, e.g. a debugger, is active
+            else:
+                self.profile = profile
+                self.metrics._local.profiling = True
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if self.profile is not None:
+            self.profile.disable()
+            self.metrics._local.profiling = False
+            _profiler_lock.release()
+            os.makedirs(self.metrics.profile_dir, exist_ok=True)
+            name = f"{self.stage}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}.prof"
+            self.profile.dump_stats(os.path.join(self.metrics.profile_dir, name))
+
+        self.metrics.observe(self.stage, elapsed)
+        if exc_type is not None:
+            self.metrics.increment("errors", stage=self.stage)
+        return False
+
+
+class Metrics:
+    """Timings of the stages of a request, kept as histograms, counters of events such as cache hits and
+    gauges of current values such as the depth of a queue.
+
+    Everything can be exported in the Prometheus text format. When disabled, timed() returns a shared
+    do-nothing context manager and increment() returns straight away."""
+
+    def __init__(self, enabled=METRICS_ENABLED, metrics_file=METRICS_FILE, profile_dir=PROFILE_DIR,
+                 buckets=BUCKETS):
+        self.enabled = enabled
+        self.metrics_file = metrics_file
+        self.profile_dir = profile_dir
+        self.buckets = tuple(buckets)
+
+        self._histograms = {}  # stage -> [bucket counts..., count above the last bucket], sum
+        self._counters = {}  # (name, stage) -> value
+        self._gauges = {}  # name -> value
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_flush = 0.0
+
+    def timed(self, stage):
+        """Context manager that records how long the stage took, and counts an error if it raises"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        """Records one timing of the stage"""
+        if not self.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts, total = self._histograms.get(stage, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._histograms[stage] = (counts, total + seconds)
+
+    def increment(self, name, amount=1, stage=None):
+        """Adds 'amount' to the counter, e.g. increment("report_cache_hits")"""
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (name, stage)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value):
+        """Sets the current value of the gauge, e.g. set_gauge("watcher_queue_depth", 12)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        """Returns a copy of the histograms, counters and gauges"""
+        with self._lock:
+            histograms = {stage: (list(counts), total) for stage, (counts, total) in self._histograms.items()}
+            return histograms, dict(self._counters), dict(self._gauges)
+
+    def prometheus_text(self):
+        """Returns every metric in the Prometheus text exposition format"""
+        histograms, counters, gauges = self.snapshot()
+        lines = ["# HELP diabetes_stage_seconds Time taken by each stage of a request.",
+                 "# TYPE diabetes_stage_seconds histogram"]
+        for stage, (counts, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'diabetes_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'diabetes_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+            lines.append(f'diabetes_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'diabetes_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        by_name = {}
+        for (name, stage), value in counters.items():
+            by_name.setdefault(name, []).append((stage, value))
+        for name in sorted(by_name):
+            lines.append(f"# TYPE diabetes_{name}_total counter")
+            for stage, value in sorted(by_name[name], key=lambda item: str(item[0])):
+                label = f'{{stage="{stage}"}}' if stage is not None else ""
+                lines.append(f"diabetes_{name}_total{label} {value}")
+
+        for name in sorted(gauges):
+            lines.append(f"# TYPE diabetes_{name} gauge")
+            lines.append(f"diabetes_{name} {gauges[name]:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes the metrics to a file in the Prometheus text format"""
+        with atomic_write(path) as f:
+            f.write(self.prometheus_text())
+
+    def flush(self, interval=5.0):
+        """Writes the metrics to the metrics file, if there is one, at most once every 'interval' seconds"""
+        if not self.enabled or self.metrics_file is None:
+            return
+        now = time.monotonic()
+        with self._lock:  # sessions flushing at the same time only write the file once
+            if now - self._last_flush < interval:
+                return
+            self._last_flush = now
+        self.write(self.metrics_file)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+# metrics of the whole process, shared by every page and session
+metrics = Metrics()
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+
+from incremental_model import IncrementalLinearRegression  # Linear Regression that can add rows without refitting
+
+# backend used by the pages, e.g. DIABETES_MODEL_BACKEND=logistic streamlit run Home_Page.py
+MODEL_BACKEND = os.environ.get("DIABETES_MODEL_BACKEND", "linear")
+
+
+class ProbabilityClassifier:
+    """Wraps a scikit-learn classifier so that predict() returns the probability of being diabetic,
+    a score between 0 and 1 that the risk categories can be applied to directly"""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def fit(self, X, y):
+        self.estimator.fit(np.asarray(X, dtype=float), np.asarray(y).ravel().astype(int))
+        return self
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.estimator.predict_proba(X)[:, 1]
+
+
+class DotProductScorer:
+    """Logistic Regression written with NumPy only: fitted with a few Newton steps and scored with one
+    dot product and a sigmoid, so predicting a single patient has almost no overhead"""
+
+    def __init__(self, iterations=25, l2=1e-4):
+        self.iterations = iterations
+        self.l2 = l2
+        self.coef_ = None
+        self.intercept_ = 0.0
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float).ravel()
+
+        # the variables are standardised while fitting so that the Newton steps are well conditioned
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1.0
+        Z = np.column_stack([np.ones(len(X)), (X - mean) / scale])
+
+        weights = np.zeros(Z.shape[1])
+        penalty = self.l2 * len(X) * np.eye(Z.shape[1])
+        penalty[0, 0] = 0.0  # the intercept isn't penalised
+        for _ in range(self.iterations):
+            p = 1.0 / (1.0 + np.exp(-(Z @ weights)))
+            gradient = Z.T @ (p - y) + penalty @ weights
+            hessian = (Z * (p * (1 - p))[:, None]).T @ Z + penalty
+            step = np.linalg.lstsq(hessian, gradient, rcond=None)[0]
+            weights -= step
+            if np.abs(step).max() < 1e-8:
+                break
+
+        # folds the standardisation back into the weights, so predicting needs no extra work
+        self.coef_ = weights[1:] / scale
+        self.intercept_ = float(weights[0] - self.coef_ @ mean)
+        return self
+
+    def predict(self, X):
+        return self.link(np.asarray(X, dtype=float) @ self.coef_ + self.intercept_)
+
+    def link(self, z):
+        """Turns the linear score into the probability of being diabetic"""
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+def _logistic():
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return ProbabilityClassifier(make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000)))
+
+
+def _gbm():
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    return ProbabilityClassifier(HistGradientBoostingClassifier(max_iter=200, learning_rate=0.05, random_state=0))
+
+
+# every backend and the function creating an unfitted model of it
+BACKENDS = {
+    "linear": IncrementalLinearRegression,  # Multiple Linear Regression, updated with new rows in place
+    "logistic": _logistic,  # scikit-learn Logistic Regression on standardised variables
+    "gbm": _gbm,  # scikit-learn histogram gradient boosting
+    "numpy": DotProductScorer,  # Logistic Regression scored with a single NumPy dot product
+}
+
+
+def make_model(backend=MODEL_BACKEND):
+    """Function that returns an unfitted model of the given backend, raises ValueError for an unknown one"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}, expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
+
+
+def is_incremental(model):
+    """Function that returns True if the model can be updated with new rows without refitting on the whole dataset"""
+    return hasattr(model, "partial_fit")
@@ -0,0 +1,347 @@
+import copy
+import hashlib  # fingerprinting the dataset contents
+import json
+import os
+import pickle  # saving the fitted models to disk
+import threading
+import time
+
+from atomic_files import atomic_write  # files are never read half written
+from columnar_dataset import COLUMNAR_DIR, current_columns, load_columns, load_frame, publish_columns, read_meta  # binary copy
+from metrics import metrics  # timings of the dataset read and the fit
+from preprocessing import compute_medians, preprocess  # missing values and physiological ranges
+from model_backends import BACKENDS, MODEL_BACKEND, is_incremental, make_model  # the type of model used
+from training_store import TrainingStore  # rows contributed by the users
+
+DATASET_PATH = "diabetes_dataset.csv"
+MODEL_DIR = "models"
+KEEP_VERSIONS = 5  # versions of the models kept on disk for rolling back
+TRAIN_CHUNK_ROWS = 500_000  # rows added to the models at a time when training on the whole dataset
+# seconds between two checks of the dataset for changes, rows contributed meanwhile are used after that
+MODEL_CHECK_INTERVAL = float(os.environ.get("DIABETES_MODEL_CHECK_SECONDS", "1"))
+
+# variables used by the automatic (PDF report) prediction
+FEATURES = ["Pregnancies", "Glucose", "BloodPressure", "SkinThickness", "Insulin", "BMI",
+            "DiabetesPedigreeFunction", "Age"]
+
+# the five common metrics used by the manual prediction
+MANUAL_FEATURES = ["Pregnancies", "Glucose", "BloodPressure", "BMI", "Age"]
+
+TARGET = "Outcome"
+
+# every model the pages use and the columns it is trained on
+MODEL_FEATURES = {
+    "automatic": FEATURES,
+    "manual": MANUAL_FEATURES,
+}
+
+
+def dataset_hash(path):
+    """Function that returns the SHA-256 of the dataset file so that we know when its content has changed"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def train_models(df, backend=MODEL_BACKEND, medians=None):
+    """Function that fits one model of the given backend per entry of MODEL_FEATURES on the given dataframe.
+
+    The rows are preprocessed the same way as when predicting: missing values are replaced by 'medians'
+    (the medians of the dataframe if not given) and values are clipped to their physiological range."""
+    if medians is None:
+        medians = compute_medians(df)
+    models = {name: make_model(backend) for name in MODEL_FEATURES}  # initiates the models
+
+    if not all(is_incremental(clf) for clf in models.values()):
+        for name, cols in MODEL_FEATURES.items():
+            X, _, _ = preprocess(df[cols].to_numpy(), cols, medians)
+            models[name].fit(X, df[TARGET])  # these backends need every row at once
+        return models
+
+    # the rows are added a chunk at a time, so a large memory-mapped dataset is never copied at once
+    for start in range(0, len(df), TRAIN_CHUNK_ROWS):
+        chunk = df.iloc[start:start + TRAIN_CHUNK_ROWS]
+        y = chunk[TARGET]  # dependent variable is the field with the name 'Outcome'
+        for name, cols in MODEL_FEATURES.items():
+            X, _, _ = preprocess(chunk[cols].to_numpy(), cols, medians)
+            models[name].partial_fit(X, y)  # line-of-best-fit between the variables and the outcome
+    return models
+
+
+def update_models(models, df, medians):
+    """Function that returns copies of the models updated with the new rows in the dataframe, preprocessed
+    with the medians the models were first trained with"""
+    updated = {}
+    for name, clf in models.items():
+        cols = MODEL_FEATURES[name]
+        clf = copy.deepcopy(clf)  # the previous version is kept for rolling back
+        X, _, _ = preprocess(df[cols].to_numpy(), cols, medians)
+        clf.partial_fit(X, df[TARGET])
+        updated[name] = clf
+    return updated
+
+
+class ModelRegistry:
+    """Keeps the fitted models of one dataset in memory and on disk.
+
+    The dataset is the CSV file plus the rows contributed to the training store. A compact binary copy
+    of it, with one memory-mapped file per column, is written to a new folder of 'columnar_dir' whenever
+    the dataset changes, so training and plotting never parse the CSV again. The models are trained
+    once and saved together with a version number and the hash of the dataset they were trained on.
+    When only new rows were contributed the models are updated with those rows, and they are only
+    retrained from scratch when the CSV file changes. The last KEEP_VERSIONS versions are kept so that
+    the registry can roll back to the previous one.
+
+    The models are trained on preprocessed rows (see preprocessing.preprocess) and the medians used to
+    replace the missing values are saved with them, so predictions replace missing values the same way.
+    The medians are computed when the models are trained from scratch and kept while rows are added.
+
+    'backend' is the type of model trained (see model_backends.BACKENDS). Backends that can't add rows to
+    a fitted model are retrained on the whole dataset instead, and switching backends retrains as well.
+
+    With a 'check_interval' the dataset is checked for changes at most once every that many seconds,
+    instead of on every load()."""
+
+    def __init__(self, dataset_path=DATASET_PATH, model_dir=MODEL_DIR, store=None, columnar_dir=COLUMNAR_DIR,
+                 backend=MODEL_BACKEND, check_interval=0.0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend {backend!r}, expected one of: {', '.join(BACKENDS)}")
+        self.dataset_path = dataset_path
+        self.model_dir = model_dir
+        self.store = store
+        self.columnar_dir = columnar_dir
+        self.backend = backend
+        self.check_interval = check_interval
+        self.registry_path = os.path.join(model_dir, "registry.pkl")
+
+        self.version = 0
+        self.dataset_hash = None
+        self.pinned = False
+        self.models = {}
+        self.medians = {}
+
+        self._stat = None  # (mtime, size, last contributed row) of the dataset when it was last hashed
+        self._checked = float("-inf")  # time the dataset was last checked for changes
+        self._lock = threading.Lock()  # streamlit runs every session in its own thread
+        self._columns_lock = threading.Lock()
+
+    def load(self):
+        """Returns the fitted models, loading them from disk or updating them if the dataset has changed"""
+        with self._lock:
+            now = time.monotonic()
+            if self.models and self._stat is not None and now - self._checked < self.check_interval:
+                return self.models
+            key = self.dataset_key()
+            store_id = key[2]
+            self._checked = now
+
+            # nothing has touched the dataset since the last check, so there is no need to hash it again
+            if self.models and key == self._stat:
+                return self.models
+
+            csv_hash = dataset_hash(self.dataset_path)
+            digest = self._digest(csv_hash, store_id)
+            if digest != self.dataset_hash:
+                saved = self._read()
+                # models saved without their medians were trained on the raw values, so they are retrained
+                compatible = (saved is not None and saved.get("backend", "linear") == self.backend
+                                and saved.get("medians") is not None)
+                if saved is not None and ((compatible and saved["dataset_hash"] == digest) or saved.get("pinned")):
+                    self._apply(saved)
+                elif (compatible and saved.get("csv_hash") == csv_hash and saved.get("store_id", 0) < store_id
+                      and all(is_incremental(clf) for clf in saved["models"].values())):
+                    # only new rows were contributed, so the models are updated with just those rows
+                    with metrics.timed("dataset_read"):
+                        rows = self.store.load_frame(since_id=saved["store_id"], until_id=store_id)
+                    with metrics.timed("fit"):
+                        models = update_models(saved["models"], rows, saved["medians"])
+                    self._save(saved, csv_hash, store_id, models, saved["medians"])
+                else:
+                    # trained on the columnar copy, whose meta says exactly which rows it holds
+                    df, meta = self._open_columnar(load_frame)
+                    with metrics.timed("fit"):
+                        medians = compute_medians(df)
+                        models = train_models(df, self.backend, medians)
+                    self._save(saved, meta["csv_hash"], meta["store_id"], models, medians)
+
+            self._stat = key
+            return self.models
+
+    def get(self, name):
+        """Returns the fitted model with the given name ('automatic' or 'manual')"""
+        return self.load()[name]
+
+    def snapshot(self):
+        """Returns the version of the models, the fitted models and the medians they were trained with, read
+        together under the lock so that all three always belong to the same version, even while another
+        thread updates them"""
+        self.load()
+        with self._lock:
+            return self.version, self.models, self.medians
+
+    def load_dataset(self):
+        """Returns the whole dataset as a dataframe of read-only memory-mapped columns"""
+        with metrics.timed("dataset_read"):
+            return self._open_columnar(load_frame)[0]
+
+    def load_columns(self):
+        """Returns every column of the dataset as a read-only memory-mapped array"""
+        return self._open_columnar(load_columns)[0]
+
+    def dataset_version(self):
+        """Returns the hash identifying the content of the dataset, the CSV file and the contributed rows"""
+        return self._columnar()[1]["dataset_hash"]
+
+    def feature_medians(self):
+        """Returns the median of every variable used to replace missing values, the ones the current
+        models were trained with"""
+        self.load()
+        return self.medians
+
+    def read_dataset(self, until_id=None):
+        """Parses the CSV file followed by the contributed rows up to 'until_id' (or the last one)"""
+        import pandas as pd
+
+        with metrics.timed("dataset_read"):
+            df = pd.read_csv(self.dataset_path)
+            if self.store is not None:
+                contributed = self.store.load_frame(until_id=until_id)
+                if not contributed.empty:
+                    df = pd.concat([df, contributed], ignore_index=True)
+        return df
+
+    def rollback(self):
+        """Goes back to the previous version of the models and keeps using it, even if new rows are
+        contributed, until resume() is called. Raises ValueError if there is no previous version."""
+        with self._lock:
+            saved = self._read()
+            if saved is None or not saved.get("history"):
+                raise ValueError("There is no previous version of the models to roll back to")
+
+            previous = dict(saved["history"][0], pinned=True, history=saved["history"][1:],
+                            latest=saved.get("latest", saved["version"]))
+            self._write(previous)
+            self._apply(previous)
+            self._stat = None
+            return self.version
+
+    def resume(self):
+        """Stops using the version that was rolled back to, the models are updated on the next load()"""
+        with self._lock:
+            saved = self._read()
+            if saved is not None and saved.get("pinned"):
+                saved["pinned"] = False
+                self._write(saved)
+            self.pinned = False
+            self.dataset_hash = None  # forces the dataset to be checked again
+            self._stat = None
+
+    def dataset_key(self):
+        """Returns a cheap key that changes whenever the dataset changes, e.g. for caching data derived from it"""
+        stat = os.stat(self.dataset_path)
+        return stat.st_mtime_ns, stat.st_size, self._store_id()
+
+    def _columnar(self):
+        """Returns the folder and meta of the columnar copy of the dataset, rebuilding it if the dataset changed"""
+        with self._columns_lock:
+            path = current_columns(self.columnar_dir)
+            key = self.dataset_key()
+            meta = read_meta(path) if path is not None else None
+            if meta is not None and tuple(meta["dataset_key"]) == key:
+                return path, meta
+
+            csv_hash = dataset_hash(self.dataset_path)
+            digest = self._digest(csv_hash, key[2])
+            if meta is None or meta["dataset_hash"] != digest:
+                os.makedirs(self.columnar_dir, exist_ok=True)
+                meta = {"dataset_key": key, "dataset_hash": digest, "csv_hash": csv_hash, "store_id": key[2]}
+                # every version gets its own folder, named after its content, and the pointer is switched to it
+                path = publish_columns(self.read_dataset(until_id=key[2]), self.columnar_dir, digest[:16], meta)
+            else:
+                # only the timestamp of the CSV changed, its content is the same
+                meta["dataset_key"] = key
+                with atomic_write(os.path.join(path, "meta.json")) as f:
+                    json.dump(meta, f)
+            return path, read_meta(path)
+
+    def _open_columnar(self, loader):
+        """Opens the columnar copy with 'loader' (load_columns or load_frame) and returns it with its meta.
+        Another process may have published a newer copy and removed this folder in between, in which case
+        the pointer is read again."""
+        path, meta = self._columnar()
+        try:
+            return loader(path), meta
+        except FileNotFoundError:
+            path, meta = self._columnar()
+            return loader(path), meta
+
+    def _store_id(self):
+        return self.store.last_id() if self.store is not None else 0
+
+    def _digest(self, csv_hash, store_id):
+        if self.store is None:
+            return csv_hash
+        # contributed rows are only ever added, so the id of the last one identifies their content
+        return hashlib.sha256(f"{csv_hash}:{store_id}".encode()).hexdigest()
+
+    def _read(self):
+        """Reads the saved models from disk, or returns None if there are none (or they can't be read)"""
+        try:
+            with open(self.registry_path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _apply(self, saved):
+        self.version = saved["version"]
+        self.dataset_hash = saved["dataset_hash"]
+        self.pinned = saved.get("pinned", False)
+        self.models = saved["models"]
+        # models saved without their medians (only kept when rolled back to) were trained with 0 for missing
+        self.medians = saved.get("medians") or {}
+
+    def _save(self, saved, csv_hash, store_id, models, medians):
+        """Saves the new version of the models to disk, keeping the previous versions in its history"""
+        history = []
+        latest = self.version
+        if saved is not None:
+            current = {k: v for k, v in saved.items() if k not in ("history", "latest")}
+            history = [current] + saved.get("history", [])
+            latest = max(latest, saved.get("latest", saved["version"]))
+        version = latest + 1  # version numbers are never reused, even after a rollback
+
+        new = {
+            "version": version,
+            "dataset_hash": self._digest(csv_hash, store_id),
+            "csv_hash": csv_hash,
+            "store_id": store_id,
+            "backend": self.backend,
+            "pinned": False,
+            "latest": version,
+            "models": models,
+            "medians": medians,
+            "history": history[:KEEP_VERSIONS - 1],
+        }
+        self._write(new)
+        self._apply(new)
+
+    def _write(self, saved):
+        os.makedirs(self.model_dir, exist_ok=True)
+        with atomic_write(self.registry_path, "wb") as f:
+            pickle.dump(saved, f)
+
+
+# shared registry for the default dataset, created once per process
+registry = ModelRegistry(store=TrainingStore(), check_interval=MODEL_CHECK_INTERVAL)
+
+
+def get_model(name):
+    """Function that returns the model with the given name trained on the default dataset"""
+    return registry.get(name)
+
+
+def get_medians():
+    """Function that returns the medians used to replace missing values in the default dataset"""
+    return registry.feature_medians()
@@ -1,7 +1,11 @@
-import pandas as pd  # Reading the data and preparing it for analysis
-from sklearn.linear_model import LinearRegression  # Training a linear regression model
-import tabula
-import csv
+from preprocessing import describe_flags, preprocess  # missing values and physiological ranges
+from model_registry import FEATURES  # the 8 variables of a medical report
+from tenants import select_hospital, tenant_registry  # Linear Regression models of every hospital
+from risk_bands import BAND_COLOURS, DETECTED_BANDS, risk_band  # the 4 categories of the prediction
+from metrics import metrics  # timings of every stage of the request
+from report_cache import report_cache  # values of the reports that were already read
+from report_ingest import ingest_reports, iter_report_paths, read_report, resolve_report_folder, score_reports  # reading the reports
+import os
 import streamlit as st  # Using Streamlit to create a simple web app to display results
 
 # setting page layout
@@ -24,16 +28,12 @@ st.markdown(
 with open("main.css") as css:
     st.markdown(f"<style>{css.read()}</style>", unsafe_allow_html=True) #connecting stylesheet
 
-# Loading the data and fitting it in the Linear Regression Algorithm
-df = pd.read_csv("diabetes_dataset.csv")
+# hospital whose dataset and models are used, kept when moving between the pages
+hospital = select_hospital(st)
 
-# setting the dependent and independent variables
-y = df["Outcome"]  # dependent variable is the field with the name 'Outcome'
-x = df.iloc[:, 0:-1]  # all columns except the last one are taken as independent variables
-
-# creating line-of-best-fit
-clf = LinearRegression()  # initiates the model
-clf.fit(x, y)  # line-of-best-fit between x and y which were assigned earlier
+# Linear Regression models of the hospital's dataset, trained now and only refitted when the dataset changes
+registry = tenant_registry(hospital)
+registry.load()
 
 st.header("Automatic Prediction Using Patient Medical Report")
 
@@ -112,61 +112,102 @@ def prediction(pred):
             2) Likely Diabetic
             3) At risk of Diabetes
             4) Unlikely to be Diabetic"""
-    if pred >= 0.8:
-        st.write("# :red[Most Likely Diabetic]")
-        detected()
-    elif 0.8 > pred >= 0.5:
-        st.write("# :orange[Likely Diabetic]")
+    band = risk_band(pred)  # same thresholds as the batch scoring
+    st.write(f"# :{BAND_COLOURS[band]}[{band}]")
+    if band in DETECTED_BANDS:
         detected()
-    elif 0.5 > pred > 0.3:
-        st.write("# :grey[At risk of Diabetes]")
-        not_detected()
     else:
-        st.write("# :green[Unlikely to be Diabetic]")
         not_detected()
 
 
 def prediction_automatic(pdf_file):
     """Function that reads the PDF medical report from the patient as input and returns the predicted value"""
-    f = open("diabetes.csv", "w")
-    a = csv.writer(f)
-
-    tables = tabula.read_pdf(pdf_file, pages=1, multiple_tables=False)
-
-    df = tables[0]["XYZ HOSPITAL, UAE"]
-
-    cols = ["Pregnancies", "Glucose", "BloodPressure", "SkinThickness", "Insulin", "BMI",
-            "DiabetesPedigreeFunction", "Age"]
+    import pandas as pd
 
-    # adding row in data frame
-    a.writerow(df)
+    # values of the "XYZ HOSPITAL, UAE" column, only parsed again if this report hasn't been seen before
+    df = read_report(pdf_file.getvalue())
 
-    # clears buffer to immediately update the dataset
-    f.flush()
-
-    # read file
-    data = pd.read_csv("diabetes.csv", names=cols, header=None)
+    # the data frame is built in memory so that every session only ever sees its own report
+    data = pd.DataFrame([df], columns=FEATURES)
 
     # display the data
     st.write("*Your Data:*")
     st.dataframe(data, width=1500)
 
+    # missing values (a 0 glucose, blood pressure, skin thickness, insulin or BMI) are replaced by the
+    # median of the dataset and values outside of their physiological range are clipped, with the medians
+    # of the same version as the model trained on all 8 variables
+    _, models, medians = registry.snapshot()
+    values, _, flags = preprocess(data.to_numpy(), FEATURES, medians)
+    if flags[0]:
+        st.write(f"*Note: {describe_flags(flags[0])}.*")
+
     # make a prediction based on the data provided
-    pred = clf.predict(data)
-    prediction(pred)
+    with metrics.timed("predict"):
+        pred = models["automatic"].predict(values)
+    with metrics.timed("render"):
+        prediction(pred)
+
+
+def prediction_reports(reports):
+    """Function that reads many PDF medical reports in parallel and predicts all of them at once"""
+    progress = st.progress(0.0, text="Reading the medical reports...")
+    results = []
+
+    # results are shown as soon as each report is read, a report that can't be read doesn't stop the others
+    for name, values, error in ingest_reports(reports):
+        results.append((name, values, error))
+        if error is None:
+            st.write(f"- *{name}*: read successfully.")
+        else:
+            st.write(f"- *{name}*: :red[not a valid PDF medical report.]")
+        progress.progress(len(results) / len(reports), text=f"Read {len(results)} of {len(reports)} reports")
+
+    with metrics.timed("predict"):
+        data = score_reports(results, model_registry=registry)
+    with metrics.timed("render"):
+        st.write("*Your Reports:*")
+        st.dataframe(data, width=1500)
+
 
 # handling exceptions such as uploading the wrong file format or a non-medical report.
 with st.form("upload-form", clear_on_submit=True):
-    pdf_file = st.file_uploader("Enter your Medical Report here", type=["pdf"], accept_multiple_files=False)
+    pdf_files = st.file_uploader("Enter your Medical Reports here", type=["pdf"], accept_multiple_files=True)
     submitted = st.form_submit_button("Upload")
-    if pdf_file and submitted is not None:
-        try:
-            prediction_automatic(pdf_file)  # runs the prediction_automatic function if pdf file is true and has data
-        except:
-            st.write("Please enter a valid PDF medical report.")  # raises exception
+    if pdf_files and submitted is not None:
+        if len(pdf_files) == 1:
+            try:
+                with metrics.timed("request_automatic"):  # also counts the reports that couldn't be read
+                    prediction_automatic(pdf_files[0])  # runs the prediction_automatic function if pdf file is true and has data
+            except:
+                st.write("Please enter a valid PDF medical report.")  # raises exception
+        else:
+            prediction_reports([(pdf_file.name, pdf_file.getvalue()) for pdf_file in pdf_files])
     else:
         st.write("Please enter your PDF medical report.")  # requests for report input
 
+cache_stats = report_cache.stats()
+st.caption(f"Report cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+           f"{cache_stats['entries']} reports in memory")
+
+# reading every report in a folder of the reports folder (DIABETES_REPORTS_DIR), e.g. the reports received in the morning
+with st.form("folder-form"):
+    folder = st.text_input("Or enter a folder of medical reports, inside the reports folder, to read all of them")
+    read_folder = st.form_submit_button("Read folder")
+    if read_folder and folder:
+        try:
+            folder = resolve_report_folder(folder)
+        except ValueError:
+            folder = None
+        if folder is not None and os.path.isdir(folder):
+            reports = iter_report_paths(folder)
+            if reports:
+                prediction_reports(reports)
+            else:
+                st.write("There are no PDF medical reports in this folder.")
+        else:
+            st.write("Please enter a valid folder inside the reports folder.")
+
 st.markdown("<h2>Help us train our model with your data!</h2>", unsafe_allow_html=True)
 
 
@@ -188,24 +229,21 @@ def add_data():
 
 data = add_data() # adds the new data to the model
 
-# We first write the data in a temporary file and then append it to the actual dataset.
-f = open("diabetes_automatic.csv", "w")
-a = csv.writer(f)
-
-# adding data in the dataset to improve model
-f1 = open("diabetes_dataset.csv", "a")
-a1 = csv.writer(f1)
-
 submit = st.button("Submit")
 
 if submit:  # upon clicking of submit button
-    a.writerow(data)  # new data row is added
-    f.flush()  # immediately clears buffer to update dataset
-    cols = ["Pregnancies", "Glucose", "BloodPressure", "SkinThickness", "Insulin", "BMI",
-            "DiabetesPedigreeFunction", "Age", "Outcome"]  # variables
+    try:
+        # adding data in the training store to improve model, the model is refitted on its next use
+        added = registry.store.add_rows([data])
+    except ValueError as error:
+        st.write(f"Please check your data: {error}")
+    else:
+        import pandas as pd
+
+        data1 = pd.DataFrame([data], columns=FEATURES + ["Outcome"])
+        st.write("*Dataset Added:*" if added else "*This data has already been added:*")
+        st.dataframe(data1, width=1500)  # displays new data
 
-    data1 = pd.read_csv("diabetes_automatic.csv", names=cols, header=None) # reads PDF file
-    st.write("*Dataset Added:*")
-    st.dataframe(data1,width=1500)  # displays new data
+        st.write("Thank you for your data!")
 
-    st.write("Thank you for your data!")
+metrics.flush()  # writes the metrics file, if one is set
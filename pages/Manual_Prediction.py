@@ -1,7 +1,10 @@
 import pandas as pd  # Reading the data and preparing it for analysis
-from sklearn.linear_model import LinearRegression  # Training a linear regression model
-import tabula
-import csv
+from preprocessing import describe_flags, missing_columns, preprocess  # missing values and physiological ranges
+from model_registry import MANUAL_FEATURES  # the 5 common metrics
+from tenants import select_hospital, tenant_registry  # Linear Regression models of every hospital
+from risk_bands import BAND_COLOURS, DETECTED_BANDS  # the 4 categories of the prediction
+from prediction_cache import INPUT_RANGES, prediction_cache  # predictions of the inputs already seen
+from metrics import metrics  # timings of every stage of the request
 import streamlit as st  # Using Streamlit to create a simple web app to display results
 
 st.set_page_config(layout="wide", page_title="Gestational Diabetes Predictor")
@@ -24,6 +27,9 @@ st.markdown(
 with open("main.css") as css:
     st.markdown(f"<style>{css.read()}</style>", unsafe_allow_html=True)
 
+# hospital whose dataset and models are used, kept when moving between the pages
+hospital = select_hospital(st)
+
 st.header("Manual prediction using four common metrics")
 
 
@@ -95,70 +101,71 @@ def detected():
              "loss, and decrease your risk of diabetes.")
 
 
-def prediction(pred):
+def prediction(entry):
     """Function that classifies the patient into the following 4 categories:
             1) Most Likely Diabetic
             2) Likely Diabetic
             3) At risk of Diabetes
             4) Unlikely to be Diabetic"""
-    if pred >= 0.8:
-        st.write("# :red[Most Likely Diabetic]")
-        detected()
-    elif 0.8 > pred >= 0.5:
-        st.write("# :orange[Likely Diabetic]")
+    band = entry["risk_band"]  # same thresholds as the batch scoring
+    st.write(f"# :{BAND_COLOURS[band]}[{band}]")
+
+    # how much every metric added to or took away from the predicted value
+    if entry["contributions"] is not None:
+        st.write("*What your prediction is based on:*")
+        st.dataframe(pd.DataFrame({"Contribution": entry["contributions"]}).T, width=1500)
+
+    if band in DETECTED_BANDS:
         detected()
-    elif 0.5 > pred > 0.3:
-        st.write("# :grey[At risk of Diabetes]")
-        not_detected()
     else:
-        st.write("# :green[Unlikely to be Diabetic]")
         not_detected()
 
 
 def prediction_manual():
     """This functions takes 5 key factors into account and predicts whether the user is likely to be diabetic or not"""
-    df1 = pd.read_csv("diabetes_dataset.csv")
-    f = open("diabetes_manual.csv", "w")
-    a = csv.writer(f)
-
-    # split the data
-    y1 = df1["Outcome"]
-    x1 = df1[["Pregnancies", "Glucose", "BloodPressure", "BMI", "Age"]]
-
-    # fit the model
-    clf1 = LinearRegression()
-    clf1.fit(x1, y1)
+    # models trained on the hospital's dataset, only refitted when the dataset changes
+    registry = tenant_registry(hospital)
 
     # take the input
-    pregnancies = st.number_input("Please enter the ***number of pregnancies***.", min_value=0, max_value=15)
+    pregnancies = st.number_input("Please enter the ***number of pregnancies***.",
+                                  min_value=INPUT_RANGES["Pregnancies"][0], max_value=INPUT_RANGES["Pregnancies"][1])
     glucose = st.number_input("Please enter your ***glucose level***. (Normal: 80-100, "
-                              "Impaired Glucose: 101-125, Diabetic: 126+)", min_value=0, max_value=200)
+                              "Impaired Glucose: 101-125, Diabetic: 126+)",
+                              min_value=INPUT_RANGES["Glucose"][0], max_value=INPUT_RANGES["Glucose"][1])
     blood_pressure = st.number_input("Please enter your ***diastolic blood pressure***. "
-                                     "(Normal: <80, High: 80+)", min_value=0, max_value=200)
+                                     "(Normal: <80, High: 80+)",
+                                     min_value=INPUT_RANGES["BloodPressure"][0],
+                                     max_value=INPUT_RANGES["BloodPressure"][1])
     bmi = st.number_input("Please enter your ***BMI***. (Underweight: <18.5, Normal: 18.5-24.9, "
-                          "Overweight: 25.0-29.9, Obese: 30.0+)", min_value=0, max_value=100)
-    age = st.number_input("Please enter your ***age***.", min_value=21, max_value=100)
+                          "Overweight: 25.0-29.9, Obese: 30.0+)",
+                          min_value=INPUT_RANGES["BMI"][0], max_value=INPUT_RANGES["BMI"][1])
+    age = st.number_input("Please enter your ***age***.", min_value=INPUT_RANGES["Age"][0],
+                          max_value=INPUT_RANGES["Age"][1])
 
     information = [pregnancies, glucose, blood_pressure, bmi, age]
-    a.writerow(information)
-    f.flush()
-    cols = ["Pregnancies", "Glucose", "BloodPressure", "BMI", "Age"]
 
-    data1 = pd.read_csv("diabetes_manual.csv", names=cols, header=None)
+    # the data frame is built in memory so that every session only ever sees its own input
+    data1 = pd.DataFrame([information], columns=MANUAL_FEATURES)
     st.write("*Your Data:*")
     st.dataframe(data1, width=1500)
 
-    count = 0
-
-    # condition to check if the user input any data or not
-    for i in information[1:]:
-        if i == 0:
-            count += 1
+    # condition to check if the user input any data or not, a 0 glucose, blood pressure or BMI means missing
+    missing = missing_columns(information, MANUAL_FEATURES)
 
     # if the user did input data, then the program will put in the data in the Linear Regression model
-    if count == 0:
-        pred = clf1.predict(data1)
-        prediction(pred)
+    if not missing:
+        # values outside of their physiological range are clipped, as they were when training the model
+        values, _, flags = preprocess(information, MANUAL_FEATURES, registry.feature_medians())
+        if flags[0]:
+            st.write(f"*Note: {describe_flags(flags[0])}.*")
+
+        # the same inputs are only predicted once per version of the model
+        with metrics.timed("predict"):
+            entry = prediction_cache.predict(registry, "manual", values[0])
+        with metrics.timed("render"):
+            prediction(entry)
 
 # calling the main prediction function
 prediction_manual()
+
+metrics.flush()  # writes the metrics file, if one is set
@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import metrics  # counters of the cache hits and misses
+from model_registry import MODEL_FEATURES  # columns of every model
+from risk_bands import risk_bands  # the 4 categories of the prediction
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "10000"))  # entries kept for every model
+
+# whole number values the manual page accepts for each of the 5 common metrics
+INPUT_RANGES = {
+    "Pregnancies": (0, 15),
+    "Glucose": (0, 200),
+    "BloodPressure": (0, 200),
+    "BMI": (0, 100),
+    "Age": (21, 100),
+}
+
+
+def normalize(values):
+    """Function that returns the key of a patient, the same for 30, 30.0 and numpy numbers"""
+    return tuple(round(float(value), 6) + 0.0 for value in values)  # + 0.0 turns -0.0 into 0.0
+
+
+class ContributionTable:
+    """Contribution (coefficient x value) of every whole number value of every variable to the score of a
+    linear model, precomputed once per version of the model.
+
+    A patient's score is the intercept plus the sum of its contributions, so it takes one lookup per
+    variable whatever the values, instead of a table of every combination (over 5 billion for the 5
+    common metrics). Values outside of 'ranges', or with decimals, are multiplied out instead."""
+
+    def __init__(self, clf, cols, ranges=INPUT_RANGES):
+        self.cols = list(cols)
+        self.coef = np.asarray(clf.coef_, dtype=float)
+        self.intercept = float(clf.intercept_)
+        self.link = getattr(clf, "link", None)  # e.g. the sigmoid of the NumPy Logistic Regression
+        self.ranges = [ranges.get(col) for col in self.cols]
+        self.tables = [coef * np.arange(r[0], r[1] + 1, dtype=float) if r is not None else None
+                       for coef, r in zip(self.coef, self.ranges)]
+
+    def contributions(self, values):
+        """Returns the contribution of every value of the patient"""
+        out = []
+        for value, coef, r, table in zip(values, self.coef, self.ranges, self.tables):
+            if table is not None and value == int(value) and r[0] <= value <= r[1]:
+                out.append(float(table[int(value) - r[0]]))
+            else:
+                out.append(float(coef * value))
+        return out
+
+    def predict(self, values):
+        """Returns the predicted value and the contributions of one patient"""
+        contributions = self.contributions(values)
+        score = self.intercept + sum(contributions)
+        if self.link is not None:
+            score = float(self.link(score))
+        return score, contributions
+
+
+class PredictionCache:
+    """Predictions of the patients already seen, keyed on the model and the normalized values.
+
+    Every entry holds the predicted value, its category and, for linear models (the 'linear' and
+    'numpy' backends), the contribution of each variable to the score, to explain the prediction.
+    The entries of a model are dropped as soon as its registry has a new version, e.g. after rows are
+    contributed or after a rollback. At most 'max_entries' patients are kept for every model, the least
+    recently used ones are dropped first."""
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, precompute=True):
+        self.max_entries = max_entries
+        self.precompute = precompute
+
+        self.hits = 0
+        self.misses = 0
+
+        self._models = {}  # (model folder, model name) -> (version, table or None, entries)
+        self._lock = threading.Lock()  # shared by every streamlit session
+
+    def predict(self, model_registry, model, values):
+        """Returns the entry of the patient, computing it with the registry's model if it isn't cached:
+        a dict with the 'prediction', its 'risk_band', the 'intercept' and the 'contributions' of every
+        variable (both None for models that aren't linear)"""
+        version, models, _ = model_registry.snapshot()  # the model and its version, never one without the other
+        clf = models[model]
+        key = normalize(values)
+        slot = (model_registry.model_dir, model)
+
+        with self._lock:
+            cached_version, table, entries = self._models.get(slot, (None, None, None))
+            if cached_version != version:
+                table = self._table(clf, MODEL_FEATURES[model]) if self.precompute else None
+                entries = OrderedDict()
+                self._models[slot] = (version, table, entries)
+
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                metrics.increment("prediction_cache_hits")
+                return entry
+            self.misses += 1
+        metrics.increment("prediction_cache_misses")
+
+        if table is not None:
+            pred, contributions = table.predict(key)
+            contributions = dict(zip(table.cols, contributions))
+            intercept = table.intercept
+        else:
+            pred = float(np.ravel(clf.predict(np.array([key])))[0])
+            contributions = intercept = None
+        entry = {"prediction": pred, "risk_band": str(risk_bands(pred)), "intercept": intercept,
+                 "contributions": contributions}
+
+        with self._lock:
+            entries[key] = entry
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        """Returns the number of hits, misses and entries in memory"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": sum(len(entries) for _, _, entries in self._models.values())}
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def _table(self, clf, cols):
+        if not hasattr(clf, "coef_") or not hasattr(clf, "intercept_"):
+            return None  # e.g. gradient boosting, predicted directly and not explained
+        return ContributionTable(clf, cols)
+
+
+# predictions shared by every session of the manual page
+prediction_cache = PredictionCache()
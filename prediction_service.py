@@ -0,0 +1,301 @@
+import asyncio
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from metrics import metrics  # timings of every stage of the request
+from model_registry import MODEL_FEATURES  # columns of every model
+from report_ingest import read_report  # values of a PDF medical report
+from preprocessing import missing_columns, preprocess  # missing values and physiological ranges
+from risk_bands import risk_bands  # the 4 categories of the prediction
+from tenants import DEFAULT_HOSPITAL, hospital_exists, tenant_registry  # datasets and models of every hospital
+
+# settings of the service, e.g. PREDICTION_SERVICE_WORKERS=8 uvicorn prediction_service:app
+SERVICE_WORKERS = int(os.environ.get("PREDICTION_SERVICE_WORKERS", "4"))
+MAX_BATCH_SIZE = int(os.environ.get("PREDICTION_SERVICE_MAX_BATCH_SIZE", "256"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("PREDICTION_SERVICE_MAX_BATCH_WAIT_MS", "5"))
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """Raised for requests the service can't answer, 'status' is the HTTP status code to reply with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_patient(patient, cols):
+    """Function that returns the values of a patient, given as an object keyed by the column names
+    or as a list in the order of the columns"""
+    if isinstance(patient, dict):
+        missing = [col for col in cols if col not in patient]
+        if missing:
+            raise RequestError(400, f"Patient is missing the columns: {', '.join(missing)}")
+        patient = [patient[col] for col in cols]
+    if not isinstance(patient, list) or len(patient) != len(cols):
+        raise RequestError(400, f"Expected the {len(cols)} values {', '.join(cols)}")
+
+    values = []
+    for col, value in zip(cols, patient):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise RequestError(400, f"{col} must be a number, got {value!r}")
+        values.append(float(value))
+    return values
+
+
+def check_manual(values, cols):
+    """Function that refuses a manual patient with a missing value, like the manual page does: the five
+    common metrics are entered by hand, so a 0 glucose, blood pressure or BMI isn't imputed"""
+    missing = missing_columns(values, cols)
+    if missing:
+        raise RequestError(400, f"Patient is missing the values: {', '.join(missing)} (0 means not measured)")
+    return values
+
+
+class MicroBatcher:
+    """Collects the patients of concurrent requests for one model of one hospital and predicts them with a
+    single call.
+
+    A batch is sent as soon as it holds 'max_batch_size' patients or 'max_wait' seconds after its
+    first patient arrived. The prediction runs on the service's worker pool, off the event loop."""
+
+    def __init__(self, model, executor, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT_MS / 1000,
+                 hospital=DEFAULT_HOSPITAL):
+        self.model = model
+        self.hospital = hospital
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0  # number of predict calls, lower than the number of patients when batching works
+
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    async def predict(self, values):
+        """Returns the predicted value, the preprocessing flags and the version of the model of one patient"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((values, future))
+        return await future
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _predict(self, rows):
+        # the model, its medians and its version are read together, an update in between can't mix them up
+        version, models, medians = tenant_registry(self.hospital).snapshot()
+        values, _, flags = preprocess(rows, MODEL_FEATURES[self.model], medians)
+        with metrics.timed("predict"):
+            return version, list(zip(models[self.model].predict(values), flags))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                version, preds = await loop.run_in_executor(self.executor, self._predict,
+                                                            [values for values, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            self.batches += 1
+            for (_, future), (pred, flags) in zip(batch, preds):
+                if not future.done():  # the client may have gone away
+                    future.set_result((float(pred), int(flags), version))
+
+
+class PredictionService:
+    """ASGI application exposing the models as JSON endpoints.
+
+        GET  /health                status, version and backend of the models
+        GET  /metrics               timings and counters in the Prometheus text format
+        POST /predict/automatic     one patient (or a list) with the 8 variables
+        POST /predict/manual        one patient (or a list) with the 5 common metrics
+        POST /predict/report        a PDF medical report as the request body
+
+    Every prediction is returned with the same category as the pages. '?hospital=<ID>' uses the dataset
+    and models of that hospital instead of the default one."""
+
+    def __init__(self, workers=SERVICE_WORKERS, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = None
+        self.batchers = {}
+        self._loop = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            status, payload = 200, await self._handle(scope, receive)
+        except RequestError as error:
+            status, payload = error.status, {"error": str(error)}
+        except Exception as error:
+            status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), b"text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), b"application/json"
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def close(self):
+        for batcher in self.batchers.values():
+            await batcher.close()
+        self.batchers = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def _handle(self, scope, receive):
+        method, path = scope["method"], scope["path"].rstrip("/")
+        hospital = self._hospital(scope)
+
+        if path == "/health":
+            if method != "GET":
+                raise RequestError(405, "Use GET for /health")
+            loop = asyncio.get_running_loop()
+            tenant = await loop.run_in_executor(self._executor(), tenant_registry, hospital)
+            return {"status": "ok", "hospital": hospital, "model_version": tenant.version,
+                    "model_backend": tenant.backend}
+
+        if path == "/metrics":
+            if method != "GET":
+                raise RequestError(405, "Use GET for /metrics")
+            return metrics.prometheus_text()
+
+        if path in ("/predict/automatic", "/predict/manual", "/predict/report"):
+            if method != "POST":
+                raise RequestError(405, f"Use POST for {path}")
+            body = await self._read_body(receive)
+            if path == "/predict/report":
+                return await self._predict_report(body, hospital)
+            return await self._predict_json(path.rsplit("/", 1)[1], body, hospital)
+
+        raise RequestError(404, f"Unknown path {path}")
+
+    def _hospital(self, scope):
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        hospital = query.get("hospital", [DEFAULT_HOSPITAL])[-1]
+        if not hospital_exists(hospital):
+            raise RequestError(404, f"Unknown hospital {hospital!r}")
+        return hospital
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise RequestError(400, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise RequestError(413, "Request body is too large")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _predict_json(self, model, body, hospital=DEFAULT_HOSPITAL):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise RequestError(400, "Request body must be JSON") from None
+
+        cols = MODEL_FEATURES[model]
+        many = isinstance(data, list) and data and isinstance(data[0], (dict, list))
+        patients = [parse_patient(patient, cols) for patient in (data if many else [data])]
+        if model == "manual":
+            patients = [check_manual(values, cols) for values in patients]
+        results = await self._predict(model, patients, hospital)
+        return results if many else results[0]
+
+    async def _predict_report(self, body, hospital=DEFAULT_HOSPITAL):
+        if not body:
+            raise RequestError(400, "Request body must be a PDF medical report")
+        loop = asyncio.get_running_loop()
+        try:
+            values = await loop.run_in_executor(self._executor(), read_report, body)
+        except Exception:
+            raise RequestError(422, "Please send a valid PDF medical report.") from None
+        result = (await self._predict("automatic", [values], hospital))[0]
+        result["values"] = dict(zip(MODEL_FEATURES["automatic"], values))
+        return result
+
+    async def _predict(self, model, patients, hospital=DEFAULT_HOSPITAL):
+        batcher = self._batcher(model, hospital)
+        results = await asyncio.gather(*(batcher.predict(values) for values in patients))
+        bands = risk_bands([pred for pred, _, _ in results])
+        return [{"prediction": pred, "risk_band": str(band), "flags": flags, "model_version": version}
+                for (pred, flags, version), band in zip(results, bands)]
+
+    def _batcher(self, model, hospital=DEFAULT_HOSPITAL):
+        # asyncio queues belong to one event loop, so the batchers are created again if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self.batchers = {}
+        key = (hospital, model)
+        if key not in self.batchers:
+            self.batchers[key] = MicroBatcher(model, self._executor(), self.max_batch_size, self.max_wait, hospital)
+        return self.batchers[key]
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prediction")
+        return self.executor
+
+
+app = PredictionService()
+
+
+def main():
+    import uvicorn  # only needed to run the service on its own
+
+    uvicorn.run("prediction_service:app", host=os.environ.get("PREDICTION_SERVICE_HOST", "127.0.0.1"),
+                port=int(os.environ.get("PREDICTION_SERVICE_PORT", "8000")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import numpy as np
+
+# the PIMA data uses 0 when these values were not measured
+MISSING_AS_ZERO = ["Glucose", "BloodPressure", "SkinThickness", "Insulin", "BMI"]
+
+# physiological range of every variable, values outside of it are clipped to the nearest bound
+RANGES = {
+    "Pregnancies": (0, 20),
+    "Glucose": (40, 400),
+    "BloodPressure": (20, 200),
+    "SkinThickness": (5, 100),
+    "Insulin": (10, 1000),
+    "BMI": (10, 80),
+    "DiabetesPedigreeFunction": (0.05, 3.0),
+    "Age": (21, 120),
+}
+
+# bits of the flags returned for every row
+FLAG_IMPUTED = 1  # at least one missing value was replaced by the median
+FLAG_CLIPPED = 2  # at least one value was outside of its physiological range
+
+
+def compute_medians(columns):
+    """Function that returns the median of every variable, leaving out the zeros of the variables where
+    0 means missing. 'columns' maps the column names to arrays, e.g. the memory-mapped dataset."""
+    medians = {}
+    for col in RANGES:
+        if col not in columns:
+            continue
+        values = np.asarray(columns[col], dtype=float)
+        if col in MISSING_AS_ZERO:
+            values = values[values != 0]
+        # rounded, the columnar copy keeps decimals as float32
+        medians[col] = round(float(np.median(values)), 6) if values.size else 0.0
+    return medians
+
+
+def missing_mask(X, cols):
+    """Function that returns a boolean array, the same shape as X, that is True where a value is missing:
+    a 0 in one of the MISSING_AS_ZERO columns, or NaN in any column"""
+    X = np.asarray(X, dtype=float)
+    zero_means_missing = np.array([col in MISSING_AS_ZERO for col in cols])
+    return np.isnan(X) | ((X == 0) & zero_means_missing)
+
+
+def missing_columns(X, cols):
+    """Function that returns the names of the columns with a missing value in any row of X, the rule used
+    to refuse a manual prediction until every value is entered"""
+    missing = missing_mask(np.atleast_2d(np.asarray(X, dtype=float)), cols).any(axis=0)
+    return [col for col, is_missing in zip(cols, missing) if is_missing]
+
+
+def preprocess(X, cols, medians):
+    """Function that cleans every row of X at once, without a Python loop over the rows.
+
+    Missing values are replaced by the median of their column and every value is clipped to the
+    physiological range of its column. Returns the cleaned values as a float array, the mask of the
+    missing values and the flags of every row (FLAG_IMPUTED and FLAG_CLIPPED)."""
+    X = np.array(X, dtype=float)  # copy, the input is never changed
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+
+    missing = missing_mask(X, cols)
+    fill = np.array([medians.get(col, 0.0) for col in cols])
+    X = np.where(missing, fill, X)
+
+    low = np.array([RANGES.get(col, (-np.inf, np.inf))[0] for col in cols], dtype=float)
+    high = np.array([RANGES.get(col, (-np.inf, np.inf))[1] for col in cols], dtype=float)
+    clipped = (X < low) | (X > high)
+    np.clip(X, low, high, out=X)
+
+    flags = np.where(missing.any(axis=1), FLAG_IMPUTED, 0) | np.where(clipped.any(axis=1), FLAG_CLIPPED, 0)
+    return X, missing, flags.astype(np.uint8)
+
+
+def describe_flags(flags):
+    """Function that returns a readable description of the flags of a row"""
+    notes = []
+    if flags & FLAG_IMPUTED:
+        notes.append("missing values imputed")
+    if flags & FLAG_CLIPPED:
+        notes.append("values clipped to range")
+    return ", ".join(notes)
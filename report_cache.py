@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from atomic_files import atomic_write  # entries are never read half written by another process
+
+# folder where the extracted values are kept between restarts, set REPORT_CACHE_DIR="" to keep them in memory only
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", "report_cache")
+REPORT_CACHE_SIZE = int(os.environ.get("REPORT_CACHE_SIZE", "4096"))
+
+
+def report_key(pdf_bytes):
+    """Function that returns the key of a report, the SHA-256 of the PDF file's contents"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+class ReportCache:
+    """Cache of the values extracted from PDF reports, keyed on the hash of the PDF.
+
+    At most 'max_entries' reports are kept in memory and the least recently used one is evicted first.
+    When a 'directory' is given every entry is also written there, so it survives restarts; that folder
+    is capped at 'max_disk_entries' files and the least recently used ones are removed first. The folder
+    is only created when the first entry is written to it, never when the cache is created."""
+
+    def __init__(self, max_entries=REPORT_CACHE_SIZE, directory=None, max_disk_entries=None):
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self.max_disk_entries = max_disk_entries or 10 * max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # shared by every streamlit session
+        self._disk_entries = 0
+        self._disk_directory = None  # folder the files were counted in, on the first write to it
+
+    def get(self, key):
+        """Returns the values saved for the key, or None if the report hasn't been read before"""
+        with self._lock:
+            values = self._entries.get(key)
+            if values is not None:
+                self._entries.move_to_end(key)  # most recently used
+                self.hits += 1
+                return values
+
+        values = self._read(key)
+        with self._lock:
+            if values is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, values)
+            return values
+
+    def put(self, key, values):
+        """Saves the values extracted from the report with the given key"""
+        values = list(values)
+        with self._lock:
+            self._remember(key, values)
+        self._write(key, values)
+
+    def stats(self):
+        """Returns the number of hits, misses and entries kept in memory"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def clear(self):
+        """Forgets every entry kept in memory and resets the counters, the files on disk are kept"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _remember(self, key, values):
+        self._entries[key] = values
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # evict the least recently used report
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                values = json.load(f)
+            os.utime(path)  # marks the file as recently used for the eviction
+            return values
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, values):
+        if self.directory is None:
+            return
+        with self._lock:
+            if self._disk_directory != self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                self._disk_entries = len(os.listdir(self.directory))
+                self._disk_directory = self.directory
+        path = self._path(key)
+        exists = os.path.exists(path)
+        with atomic_write(path) as f:
+            json.dump(values, f)
+
+        with self._lock:
+            if not exists:
+                self._disk_entries += 1
+            evict = self._disk_entries > self.max_disk_entries
+        if evict:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Removes the least recently used tenth of the files on disk"""
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith(".json")]
+        files.sort(key=lambda path: os.path.getmtime(path))
+        remove = len(files) - self.max_disk_entries + self.max_disk_entries // 10
+        for path in files[:max(remove, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_entries = len(files) - max(remove, 0)
+
+
+# cache shared by every session of the app
+report_cache = ReportCache(directory=REPORT_CACHE_DIR)
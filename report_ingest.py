@@ -0,0 +1,186 @@
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import metrics  # timings of the extraction, cache hits and errors
+from model_registry import FEATURES, registry  # Linear Regression models shared by all the pages
+from report_cache import report_cache, report_key  # values of the reports that were already read
+from preprocessing import preprocess  # missing values and physiological ranges
+from risk_bands import risk_bands  # the 4 categories of the prediction
+
+# name of the column holding the patient's values in the hospital's report template
+REPORT_COLUMN = "XYZ HOSPITAL, UAE"
+
+# folder the automatic page may read reports from, e.g. DIABETES_REPORTS_DIR=/data/reports streamlit run Home_Page.py
+REPORTS_ROOT = os.environ.get("DIABETES_REPORTS_DIR", "Medical Reports")
+
+# tabula reads every report with Java: inside the worker process through jpype, if it is installed, so every
+# worker keeps its own JVM alive, and otherwise by starting a new `java` process for each report. Either way
+# Java does most of the work, so a handful of workers is enough to keep tabula busy
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def extract_report(pdf_file):
+    """Function that reads the table of a PDF medical report and returns the 8 values of the patient"""
+    import tabula
+
+    tables = tabula.read_pdf(pdf_file, pages=1, multiple_tables=False)
+    values = [float(value) for value in tables[0][REPORT_COLUMN]]
+    if len(values) != len(FEATURES):
+        raise ValueError(f"Expected {len(FEATURES)} values in the report but found {len(values)}")
+    return values
+
+
+def _extract(pdf_bytes):
+    """Runs in the worker processes, returns the values and the time taken to read this one report"""
+    start = time.perf_counter()
+    values = extract_report(io.BytesIO(pdf_bytes))
+    return values, time.perf_counter() - start
+
+
+def read_report(pdf_bytes, cache=report_cache):
+    """Function that returns the 8 values of a report, the PDF is only parsed if it isn't in the cache"""
+    key = report_key(pdf_bytes)
+    values = cache.get(key)
+    if values is None:
+        metrics.increment("report_cache_misses")
+        with metrics.timed("pdf_extract"):
+            values = extract_report(io.BytesIO(pdf_bytes))
+        cache.put(key, values)
+    else:
+        metrics.increment("report_cache_hits")
+    return values
+
+
+def _get_pool(max_workers):
+    """Returns the process pool shared by every session, so its workers (and their JVMs, with jpype) are only
+    started once"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # 'spawn' because forking a process that is running streamlit's threads or a JVM is not safe
+            _pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = max_workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def resolve_report_folder(folder, root=None):
+    """Function that returns the real path of a folder of reports typed by a user, relative to 'root'
+    (REPORTS_ROOT by default). Raises ValueError if it resolves outside of 'root', e.g. with '..', an
+    absolute path or a symbolic link, so the server never reads files it wasn't meant to."""
+    root = os.path.realpath(REPORTS_ROOT if root is None else root)
+    path = os.path.realpath(os.path.join(root, folder))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"{folder!r} is outside of the reports folder")
+    return path
+
+
+def iter_report_paths(directory):
+    """Function that returns (name, path) of every PDF report in the folder, sorted by name"""
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(".pdf"))
+    return [(name, os.path.join(directory, name)) for name in names]
+
+
+def _submit(pool, pending):
+    return {pool.submit(_extract, pdf_bytes): (name, key) for name, key, pdf_bytes in pending}
+
+
+def ingest_reports(reports, max_workers=DEFAULT_WORKERS, cache=report_cache):
+    """Function that extracts the values of many reports in parallel.
+
+    'reports' is a list of (name, source) where source is the PDF as bytes or its path. Yields
+    (name, values, error) for every report as soon as it is done, a failing report only sets its error.
+    Reports that are already in the cache are returned straight away without being parsed again."""
+    done = []
+    pending = []
+    for name, source in reports:
+        try:
+            if isinstance(source, bytes):
+                pdf_bytes = source
+            else:
+                with open(source, "rb") as f:
+                    pdf_bytes = f.read()
+        except OSError as error:
+            done.append((name, None, error))
+            continue
+
+        key = report_key(pdf_bytes)
+        values = cache.get(key)
+        if values is not None:
+            metrics.increment("report_cache_hits")
+            done.append((name, values, None))
+        else:
+            metrics.increment("report_cache_misses")
+            pending.append((name, key, pdf_bytes))
+
+    futures = {}
+    if pending:
+        pool = _get_pool(max_workers)
+        try:
+            futures = _submit(pool, pending)
+        except BrokenProcessPool:
+            _reset_pool()  # a worker died earlier, start a fresh pool and try once more
+            futures = _submit(_get_pool(max_workers), pending)
+
+    yield from done
+
+    broken = False
+    for future in as_completed(futures):
+        name, key = futures[future]
+        try:
+            # timed in the worker, so neither the wait in the pool's queue nor the caller's work is counted
+            values, elapsed = future.result()
+            metrics.observe("pdf_ingest", elapsed)
+            cache.put(key, values)
+            yield name, values, None
+        except BrokenProcessPool as error:
+            broken = True
+            metrics.increment("errors", stage="pdf_ingest")
+            yield name, None, error
+        except Exception as error:
+            metrics.increment("errors", stage="pdf_ingest")
+            yield name, None, error
+
+    if broken:
+        _reset_pool()
+
+
+def score_reports(results, model="automatic", model_registry=registry):
+    """Function that scores every successfully extracted report with a single prediction.
+
+    Takes the (name, values, error) results of ingest_reports() and returns a dataframe indexed by the
+    name of the report with its values, the predicted value, the category and the preprocessing flags.
+    'model_registry' is the registry of the hospital whose model is used."""
+    import pandas as pd
+
+    scored = [(name, values) for name, values, error in results if error is None]
+    if not scored:
+        return pd.DataFrame(columns=FEATURES + ["Prediction", "RiskBand", "Flags"])
+
+    data = pd.DataFrame([values for _, values in scored], columns=FEATURES,
+                        index=pd.Index([name for name, _ in scored], name="Report"))
+    _, models, medians = model_registry.snapshot()  # the model and the medians of the same version
+    values, _, flags = preprocess(data[FEATURES].to_numpy(), FEATURES, medians)
+    pred = models[model].predict(values)  # one vectorized prediction for every report
+    data["Prediction"] = pred
+    data["RiskBand"] = risk_bands(pred)
+    data["Flags"] = flags
+    return data
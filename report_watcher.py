@@ -0,0 +1,363 @@
+import argparse  # command line interface
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import metrics  # throughput, queue depth and errors of the watcher
+from model_registry import FEATURES  # the 8 values of a report
+from report_cache import report_key  # SHA-256 of the PDF, the key of the ledger
+from report_ingest import DEFAULT_WORKERS, ingest_reports, score_reports  # reading and scoring the reports
+from tenants import DEFAULT_HOSPITAL, tenant_registry  # models of every hospital
+from training_store import connect  # SQLite connections in WAL mode, like the training store's
+
+DEFAULT_QUEUE_SIZE = 64  # reports read from the folder but not scored yet, the folder isn't polled while full
+DEFAULT_BATCH_SIZE = 16  # reports sent to the extraction workers at a time
+DEFAULT_POLL_INTERVAL = 2.0  # seconds between two looks at the folder
+DEFAULT_SETTLE = 1.0  # seconds a file must be left untouched before it is read, so half copied files are skipped
+LEDGER_NAME = ".processed.db"  # default ledger, kept in the watched folder
+
+# columns of the output file, one row per report
+OUTPUT_COLUMNS = ["Report", "SHA256", "ProcessedAt"] + FEATURES + ["Prediction", "RiskBand", "Flags", "Error"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+    sha256 TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('scored', 'failed')),
+    error TEXT,
+    processed_at REAL NOT NULL
+)
+"""
+
+
+class ProcessedLedger:
+    """Reports that were already processed, kept in a SQLite database in WAL mode and keyed on the SHA-256
+    of the PDF, so a report is never scored twice, even after a restart or if it is copied in again"""
+
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return connect(self.path)
+
+    def __contains__(self, sha):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM processed WHERE sha256 = ?", (sha,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def record(self, entries):
+        """Records a batch of (sha, name, error) in one transaction, error is None for a scored report"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO processed (sha256, name, status, error, processed_at) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 [(sha, name, "scored" if error is None else "failed", error, now)
+                                  for sha, name, error in entries])
+        finally:
+            conn.close()
+
+    def forget_failed(self):
+        """Removes the reports that couldn't be read, e.g. after fixing the Java install, so they are
+        processed again. Returns how many were removed."""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM processed WHERE status = 'failed'").rowcount
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+        finally:
+            conn.close()
+
+
+class _CsvSink:
+    """Appends the results to a CSV file, writing the header only when the file is new"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, rows):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS)
+            if new:
+                writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())  # on disk before the reports are marked as processed in the ledger
+
+
+class ReportWatcher:
+    """Watches a folder for new PDF medical reports, scores them and appends the results to a CSV file.
+
+    A scanner thread polls the folder and puts every new report on a queue of at most 'max_queue'
+    reports; while the queue is full the scanner waits, so a large drop of files never piles up in
+    memory. A worker thread takes up to 'batch_size' reports at a time, extracts them on at most
+    'max_workers' processes (see report_ingest.ingest_reports), scores them with one prediction and
+    writes them to the output file. Every report is then recorded in the ledger by the SHA-256 of its
+    contents, and reports found in the ledger are skipped, so restarting the watcher never scores a
+    report twice. A report that can't be read is written with its error and isn't retried, unless its
+    extraction worker died.
+
+    The results are written before the ledger, so a crash in between can write a report a second
+    time on restart, with the same SHA256 column."""
+
+    def __init__(self, directory, output_path, ledger_path=None, model="automatic", hospital=DEFAULT_HOSPITAL,
+                 max_queue=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_WORKERS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, settle=DEFAULT_SETTLE):
+        self.directory = directory
+        self.model = model
+        self.hospital = hospital
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.settle = settle
+
+        self.sink = _CsvSink(output_path)
+        self.ledger = ProcessedLedger(ledger_path or os.path.join(directory, LEDGER_NAME))
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._threads = []
+        self._looked_at = {}  # path -> (mtime, size) of the files already queued or skipped
+        self._in_progress = set()  # SHA-256 of the reports queued but not recorded in the ledger yet
+        self._lock = threading.Lock()
+        self._recent = deque()  # times the last reports were processed, for the current throughput
+
+        self.started = None
+        self.queued = 0
+        self.scored = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def start(self):
+        """Starts the scanner and worker threads in the background"""
+        self._stop.clear()
+        self.started = time.monotonic()
+        self._threads = [threading.Thread(target=self._scan_loop, name="report-scanner", daemon=True),
+                         threading.Thread(target=self._work_loop, name="report-worker", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Stops watching the folder once the batch being scored is written"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self):
+        """Scores every report in the folder now and returns once they are all processed"""
+        if self.started is None:
+            self.started = time.monotonic()
+        for item in self._new_reports(settle=0):
+            self._queue.put(item)
+            if self._queue.full():
+                self._process(self._take_batch(block=False))
+        while not self._queue.empty():
+            self._process(self._take_batch(block=False))
+
+    def stats(self):
+        """Returns the counts of the watcher, the reports waiting in the queue and the throughput, in
+        reports per second, since it started and over the last minute"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            elapsed = now - self.started if self.started is not None else 0.0
+            processed = self.scored + self.failed
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queued": self.queued,
+                "scored": self.scored,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "throughput": processed / elapsed if elapsed > 0 else 0.0,
+                "throughput_last_minute": len(self._recent) / min(60.0, elapsed) if elapsed > 0 else 0.0,
+            }
+
+    def _scan_loop(self):
+        while not self._stop.is_set():
+            for item in self._new_reports(self.settle):
+                # waits while the queue is full, the folder is looked at again once there is room
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                metrics.set_gauge("watcher_queue_depth", self._queue.qsize())
+                if self._stop.is_set():
+                    return
+            self._stop.wait(self.poll_interval)
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(block=True)
+            try:
+                self._process(batch)
+            except Exception as error:
+                # e.g. the output file can't be written, the reports are picked up again on the next poll
+                print(f"Could not process {len(batch)} reports: {type(error).__name__}: {error}", file=sys.stderr)
+                metrics.increment("errors", stage="watcher_batch")
+                self._forget([(name, sha) for name, sha, _ in batch])
+
+    def _forget(self, reports):
+        """Lets the scanner queue the (name, sha) reports again"""
+        with self._lock:
+            for name, sha in reports:
+                self._in_progress.discard(sha)
+                self._looked_at.pop(os.path.join(self.directory, name), None)
+
+    def _new_reports(self, settle):
+        """Yields (name, sha, pdf bytes) of the PDF files that weren't looked at yet and aren't in the ledger"""
+        try:
+            entries = sorted(os.scandir(self.directory), key=lambda entry: entry.name)
+        except OSError:
+            return
+        now = time.time()
+        for entry in entries:
+            if not entry.name.lower().endswith(".pdf") or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # removed since the folder was listed
+            signature = (stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                looked_at = self._looked_at.get(entry.path)
+            if looked_at == signature or now - stat.st_mtime < settle:
+                continue
+
+            try:
+                with open(entry.path, "rb") as f:
+                    pdf_bytes = f.read()
+            except OSError:
+                continue
+            with self._lock:
+                self._looked_at[entry.path] = signature
+            sha = report_key(pdf_bytes)
+            with self._lock:
+                seen = sha in self._in_progress
+            if seen or sha in self.ledger:
+                with self._lock:
+                    self.skipped += 1
+                metrics.increment("watcher_skipped")
+                continue
+
+            with self._lock:
+                self._in_progress.add(sha)
+                self.queued += 1
+            yield entry.name, sha, pdf_bytes
+
+    def _take_batch(self, block):
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=0.5))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        metrics.set_gauge("watcher_queue_depth", self._queue.qsize())
+        return batch
+
+    def _process(self, batch):
+        """Extracts, scores and writes a batch of reports, then records them in the ledger"""
+        if not batch:
+            return
+        with metrics.timed("watcher_batch"):
+            sha_of = {name: sha for name, sha, _ in batch}
+            results = list(ingest_reports([(name, pdf_bytes) for name, _, pdf_bytes in batch], self.max_workers))
+
+            # a worker process that died says nothing about the report, it is tried again on the next poll
+            retry = [name for name, _, error in results if isinstance(error, BrokenProcessPool)]
+            if retry:
+                results = [result for result in results if result[0] not in retry]
+                self._forget([(name, sha_of[name]) for name in retry])
+            scored = score_reports(results, self.model, tenant_registry(self.hospital))
+
+            now = time.strftime("%Y-%m-%dT%H:%M:%S")
+            rows = []
+            for name, values, error in results:
+                row = {"Report": name, "SHA256": sha_of[name], "ProcessedAt": now}
+                if error is None:
+                    row.update(dict(zip(FEATURES, values)))
+                    result = scored.loc[name]
+                    row.update(Prediction=result["Prediction"], RiskBand=result["RiskBand"], Flags=result["Flags"])
+                else:
+                    row["Error"] = f"{type(error).__name__}: {error}"
+                rows.append(row)
+            if rows:
+                self.sink.write(rows)
+                self.ledger.record([(sha_of[row["Report"]], row["Report"], row.get("Error")) for row in rows])
+
+        failed = sum(1 for row in rows if row.get("Error"))
+        metrics.increment("watcher_scored", len(rows) - failed)
+        if failed:
+            metrics.increment("watcher_failed", failed)
+        with self._lock:
+            self.scored += len(rows) - failed
+            self.failed += failed
+            self._in_progress.difference_update(sha_of[row["Report"]] for row in rows)
+            now = time.monotonic()
+            self._recent.extend([now] * len(rows))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a folder for PDF medical reports and score them.")
+    parser.add_argument("directory", help="folder the reports are dropped in")
+    parser.add_argument("output", help="CSV file the results are appended to")
+    parser.add_argument("--ledger", help=f"ledger of the processed reports, by default {LEDGER_NAME} in the folder")
+    parser.add_argument("--hospital", default=DEFAULT_HOSPITAL, help="hospital whose model is used")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="reports waiting at most")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="reports scored at a time")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="PDF extraction processes")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="seconds between polls")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="seconds between two stats lines")
+    parser.add_argument("--once", action="store_true", help="score the reports in the folder and exit")
+    parser.add_argument("--retry-failed", action="store_true", help="process the reports that failed before again")
+    args = parser.parse_args(argv)
+
+    watcher = ReportWatcher(args.directory, args.output, args.ledger, hospital=args.hospital,
+                            max_queue=args.queue_size, batch_size=args.batch_size, max_workers=args.workers,
+                            poll_interval=args.poll_interval)
+    if args.retry_failed:
+        print(f"{watcher.ledger.forget_failed()} failed reports will be processed again", file=sys.stderr)
+    if args.once:
+        watcher.run_once()
+        print(watcher.stats())
+        return
+
+    watcher.start()
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            stats = watcher.stats()
+            print(f"queue {stats['queue_depth']}  scored {stats['scored']}  failed {stats['failed']}  "
+                  f"skipped {stats['skipped']}  {stats['throughput_last_minute']:.2f} reports/s", file=sys.stderr)
+            metrics.flush()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
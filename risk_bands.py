@@ -0,0 +1,36 @@
+import numpy as np
+
+# the four categories the patient is classified into, from the highest risk to the lowest
+MOST_LIKELY = "Most Likely Diabetic"
+LIKELY = "Likely Diabetic"
+AT_RISK = "At risk of Diabetes"
+UNLIKELY = "Unlikely to be Diabetic"
+
+RISK_BANDS = [MOST_LIKELY, LIKELY, AT_RISK, UNLIKELY]
+
+# colour used to display each category on the pages
+BAND_COLOURS = {
+    MOST_LIKELY: "red",
+    LIKELY: "orange",
+    AT_RISK: "grey",
+    UNLIKELY: "green",
+}
+
+# categories for which the precautions for diabetic patients are shown
+DETECTED_BANDS = {MOST_LIKELY, LIKELY}
+
+
+def risk_bands(preds):
+    """Function that classifies every predicted value into one of the 4 categories at once:
+            1) Most Likely Diabetic  (0.8 and above)
+            2) Likely Diabetic       (0.5 to 0.8)
+            3) At risk of Diabetes   (0.3 to 0.5, 0.3 excluded)
+            4) Unlikely to be Diabetic"""
+    preds = np.asarray(preds, dtype=float)
+    conditions = [preds >= 0.8, preds >= 0.5, preds > 0.3]
+    return np.select(conditions, RISK_BANDS[:3], default=UNLIKELY)
+
+
+def risk_band(pred):
+    """Function that returns the category of a single predicted value"""
+    return str(risk_bands(np.ravel(pred)[0]))
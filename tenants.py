@@ -0,0 +1,213 @@
+import os
+import pickle
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+from atomic_files import atomic_write  # the dataset is never read half written
+from metrics import metrics  # counters of the tenant cache
+from model_registry import DATASET_PATH, MODEL_CHECK_INTERVAL, ModelRegistry, registry  # the dataset and models of one hospital
+from training_store import COLUMNS, TrainingStore  # rows contributed by the users
+
+# settings, e.g. DIABETES_HOSPITALS_DIR=/data/hospitals DIABETES_TENANT_MEMORY_MB=512 streamlit run Home_Page.py
+HOSPITALS_DIR = os.environ.get("DIABETES_HOSPITALS_DIR", "hospitals")
+TENANT_MEMORY_BUDGET = int(float(os.environ.get("DIABETES_TENANT_MEMORY_MB", "256")) * 1024 * 1024)
+# seconds between two checks of a hospital's dataset, DIABETES_MODEL_CHECK_SECONDS unless set on its own
+TENANT_CHECK_INTERVAL = float(os.environ.get("DIABETES_TENANT_CHECK_SECONDS", MODEL_CHECK_INTERVAL))
+
+# the hospital using the dataset of the project, diabetes_dataset.csv
+DEFAULT_HOSPITAL = "default"
+
+_HOSPITAL_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def validate_hospital_id(hospital_id):
+    """Function that checks the hospital ID can safely be used as a folder name, raises ValueError if not"""
+    if not isinstance(hospital_id, str) or not _HOSPITAL_ID.match(hospital_id):
+        raise ValueError(f"Invalid hospital ID {hospital_id!r}, use letters, digits, '-' and '_'")
+    return hospital_id
+
+
+def hospital_dir(hospital_id, hospitals_dir=HOSPITALS_DIR):
+    """Function that returns the folder holding the dataset, models and contributed rows of a hospital"""
+    return os.path.join(hospitals_dir, validate_hospital_id(hospital_id))
+
+
+def hospital_ids(hospitals_dir=HOSPITALS_DIR):
+    """Function that returns the ID of every hospital with its own dataset, the default hospital first"""
+    try:
+        names = os.listdir(hospitals_dir)
+    except OSError:
+        names = []
+    ids = sorted(name for name in names if name != DEFAULT_HOSPITAL and _HOSPITAL_ID.match(name)
+                 and os.path.isfile(os.path.join(hospitals_dir, name, DATASET_PATH)))
+    return [DEFAULT_HOSPITAL] + ids
+
+
+def hospital_exists(hospital_id, hospitals_dir=HOSPITALS_DIR):
+    """Function that returns True if the ID is the default hospital or a hospital with its own dataset"""
+    if hospital_id == DEFAULT_HOSPITAL:
+        return True
+    if not isinstance(hospital_id, str) or not _HOSPITAL_ID.match(hospital_id):
+        return False
+    return os.path.isfile(os.path.join(hospitals_dir, hospital_id, DATASET_PATH))
+
+
+def create_hospital(hospital_id, dataset, hospitals_dir=HOSPITALS_DIR):
+    """Function that adds a hospital with its own dataset, given as a CSV file path or a dataframe with
+    the nine columns of diabetes_dataset.csv. Raises ValueError if the ID or the columns are invalid."""
+    import pandas as pd
+
+    if hospital_id == DEFAULT_HOSPITAL:
+        raise ValueError(f"{DEFAULT_HOSPITAL!r} is the hospital of the project's own dataset")
+    df = pd.read_csv(dataset) if isinstance(dataset, str) else dataset
+    missing = [col for col in COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Dataset is missing the columns: {', '.join(missing)}")
+
+    folder = hospital_dir(hospital_id, hospitals_dir)
+    os.makedirs(folder, exist_ok=True)
+    with atomic_write(os.path.join(folder, DATASET_PATH), newline="") as f:
+        df[COLUMNS].to_csv(f, index=False)  # the models are retrained on their next load
+    return folder
+
+
+def remove_hospital(hospital_id, hospitals_dir=HOSPITALS_DIR):
+    """Function that deletes the dataset, models and contributed rows of a hospital"""
+    if hospital_id == DEFAULT_HOSPITAL:
+        raise ValueError(f"{DEFAULT_HOSPITAL!r} can't be removed")
+    tenants.evict(hospital_id)
+    shutil.rmtree(hospital_dir(hospital_id, hospitals_dir), ignore_errors=True)
+
+
+def models_size(models):
+    """Function that estimates the memory used by the fitted models from the size of their pickle"""
+    return len(pickle.dumps(models, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class TenantCache:
+    """Keeps the model registries of the most recently used hospitals in memory, within a memory budget.
+
+    Each hospital has its own dataset, contributed rows, columnar copy and saved models under
+    hospitals_dir/<hospital ID>. A hospital's registry is created and its models loaded on first use.
+    When the fitted models of all the hospitals held would use more than 'memory_budget' bytes, the least
+    recently used hospitals are dropped; their models are read back from disk the next time they are
+    used, without retraining. The default hospital is the shared registry and is never dropped.
+
+    Checking whether a hospital's dataset changed costs a file stat and a query of its training store, so
+    the registries only check it once every 'check_interval' seconds."""
+
+    def __init__(self, memory_budget=TENANT_MEMORY_BUDGET, hospitals_dir=HOSPITALS_DIR, default=registry,
+                 check_interval=TENANT_CHECK_INTERVAL):
+        self.memory_budget = memory_budget
+        self.hospitals_dir = hospitals_dir
+        self.default = default
+        self.check_interval = check_interval
+
+        self._registries = OrderedDict()  # hospital ID -> registry, least recently used first
+        self._sizes = {}  # hospital ID -> (version of its models, their estimated size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, hospital_id=DEFAULT_HOSPITAL, load=True):
+        """Returns the registry of the hospital, with its models loaded unless 'load' is False (e.g. when
+        only the dataset is needed). Raises ValueError for an invalid ID and FileNotFoundError for a
+        hospital without a dataset."""
+        if hospital_id == DEFAULT_HOSPITAL:
+            if load:
+                self.default.load()
+            return self.default
+
+        with self._lock:
+            tenant = self._registries.get(hospital_id)
+            hit = tenant is not None
+            if hit:
+                self._registries.move_to_end(hospital_id)
+                self.hits += 1
+            else:
+                tenant = self._create(hospital_id)
+                self._registries[hospital_id] = tenant
+                self.misses += 1
+        metrics.increment("tenant_cache_hits" if hit else "tenant_cache_misses")
+        if not load:
+            return tenant
+
+        # loaded outside of the lock, so a hospital being trained doesn't hold up the others
+        tenant.load()
+        self._account(hospital_id, tenant)
+        return tenant
+
+    def evict(self, hospital_id):
+        """Drops the hospital from memory, its models are read back from disk on its next use"""
+        with self._lock:
+            self._registries.pop(hospital_id, None)
+            self._sizes.pop(hospital_id, None)
+
+    def memory_used(self):
+        """Returns the estimated memory used by the fitted models of the hospitals held"""
+        with self._lock:
+            return sum(size for _, size in self._sizes.values())
+
+    def stats(self):
+        """Returns the number of hospitals held, their memory use and the hits, misses and evictions"""
+        with self._lock:
+            return {"tenants": len(self._registries), "memory_used": sum(s for _, s in self._sizes.values()),
+                    "memory_budget": self.memory_budget, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._registries.clear()
+            self._sizes.clear()
+
+    def _create(self, hospital_id):
+        folder = hospital_dir(hospital_id, self.hospitals_dir)
+        dataset_path = os.path.join(folder, DATASET_PATH)
+        if not os.path.isfile(dataset_path):
+            raise FileNotFoundError(f"Hospital {hospital_id!r} has no dataset in {folder}")
+        return ModelRegistry(dataset_path=dataset_path, model_dir=os.path.join(folder, "models"),
+                             store=TrainingStore(os.path.join(folder, "diabetes_contributions.db")),
+                             columnar_dir=os.path.join(folder, "dataset_cache"), check_interval=self.check_interval)
+
+    def _account(self, hospital_id, tenant):
+        """Records the size of the hospital's models and drops the least recently used hospitals while
+        the budget is exceeded, never the one that has just been used"""
+        with self._lock:
+            if self._registries.get(hospital_id) is not tenant:
+                return  # evicted while its models were loading
+            version, _ = self._sizes.get(hospital_id, (None, 0))
+            if version != tenant.version:
+                self._sizes[hospital_id] = (tenant.version, models_size(tenant.models))
+
+            used = sum(size for _, size in self._sizes.values())
+            while used > self.memory_budget and len(self._registries) > 1:
+                oldest = next(iter(self._registries))
+                if oldest == hospital_id:
+                    break
+                del self._registries[oldest]
+                used -= self._sizes.pop(oldest, (None, 0))[1]
+                self.evictions += 1
+                metrics.increment("tenant_evictions")
+
+
+# registries of every hospital, shared by every page and session of the process
+tenants = TenantCache()
+
+
+def tenant_registry(hospital_id=DEFAULT_HOSPITAL, load=True):
+    """Function that returns the registry of the hospital, with its models loaded unless 'load' is False"""
+    return tenants.get(hospital_id, load)
+
+
+def select_hospital(st, hospitals_dir=HOSPITALS_DIR):
+    """Function that shows the hospital picker in the sidebar of a page and returns the ID picked. The
+    choice is kept in the session, so it stays the same when moving between the pages."""
+    hospitals = hospital_ids(hospitals_dir)
+    selected = st.session_state.get("hospital")
+    hospital = st.sidebar.selectbox("Hospital", hospitals,
+                                    index=hospitals.index(selected) if selected in hospitals else 0)
+    st.session_state["hospital"] = hospital
+    return hospital
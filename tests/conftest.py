@@ -0,0 +1,59 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import report_ingest  # noqa: E402
+import tenants  # noqa: E402
+from model_registry import DATASET_PATH, ModelRegistry  # noqa: E402
+from report_cache import report_cache, report_key  # noqa: E402
+from training_store import TrainingStore  # noqa: E402
+
+
+def folder_registry(folder):
+    """Function that returns a model registry of a copy of the project's dataset in 'folder', the copy is
+    only made once so that several processes can share the folder"""
+    dataset_path = os.path.join(folder, DATASET_PATH)
+    if not os.path.exists(dataset_path):
+        shutil.copy(os.path.join(ROOT, DATASET_PATH), dataset_path)
+    return ModelRegistry(dataset_path=dataset_path, model_dir=os.path.join(folder, "models"),
+                         store=TrainingStore(os.path.join(folder, "contributions.db")),
+                         columnar_dir=os.path.join(folder, "dataset_cache"))
+
+
+def write_reports(folder, values_of, cache=report_cache):
+    """Function that writes PDF files whose values are already in the report cache, so the reports are
+    'read' without tabula and Java. 'values_of' maps the file names to their 8 values."""
+    os.makedirs(folder, exist_ok=True)
+    for name, values in values_of.items():
+        pdf_bytes = f"%PDF-1.4 {name} {values}".encode()  # a different hash for every report
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(pdf_bytes)
+        cache.put(report_key(pdf_bytes), values)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Model registry of a copy of the dataset in a temporary folder, used as the default hospital's
+    registry by the pages, the service and the watcher for the length of the test"""
+    model_registry = folder_registry(str(tmp_path))
+    monkeypatch.setattr(tenants, "tenants", tenants.TenantCache(hospitals_dir=str(tmp_path / "hospitals"),
+                                                                default=model_registry))
+    return model_registry
+
+
+@pytest.fixture
+def reports(tmp_path, monkeypatch):
+    """write_reports() with the report cache and the reports folder moved to the temporary folder for the
+    length of the test"""
+    cache_dir = tmp_path / "report_cache"
+    cache_dir.mkdir()
+    monkeypatch.setattr(report_cache, "directory", str(cache_dir))
+    monkeypatch.setattr(report_ingest, "REPORTS_ROOT", str(tmp_path))
+    report_cache.clear()
+    yield write_reports
+    report_cache.clear()
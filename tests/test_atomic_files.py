@@ -0,0 +1,24 @@
+import pytest
+
+from atomic_files import atomic_write
+
+
+def test_replaces_the_file_once_written(tmp_path):
+    path = tmp_path / "file.json"
+    path.write_text("old")
+    with atomic_write(str(path)) as f:
+        f.write("new")
+        assert path.read_text() == "old"  # other readers still see the old file
+    assert path.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.json"]
+
+
+def test_keeps_the_old_file_if_writing_fails(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), "wb") as f:
+            f.write(b"half")
+            raise RuntimeError("disk full")
+    assert path.read_bytes() == b"old"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.bin"]
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_predict import main, score_file
+from model_registry import FEATURES, MANUAL_FEATURES
+from preprocessing import preprocess
+from risk_bands import RISK_BANDS, risk_bands
+
+
+@pytest.fixture
+def patients(registry):
+    df = pd.read_csv(registry.dataset_path).drop(columns="Outcome").head(53)
+    df.insert(0, "PatientID", [f"P{i:03}" for i in range(len(df))])  # other columns are kept as they are
+    return df
+
+
+def expected(registry, df, model):
+    cols = FEATURES if model == "automatic" else MANUAL_FEATURES
+    X, _, flags = preprocess(df[cols].to_numpy(), cols, registry.feature_medians())
+    return registry.get(model).predict(X), flags
+
+
+@pytest.mark.parametrize("model", ["automatic", "manual"])
+@pytest.mark.parametrize("source, target", [("csv", "csv"), ("parquet", "parquet"), ("csv", "parquet")])
+def test_chunks_are_scored_like_the_whole_file(registry, patients, tmp_path, model, source, target):
+    input_path = str(tmp_path / f"patients.{source}")
+    output_path = str(tmp_path / f"predictions.{target}")
+    if source == "csv":
+        patients.to_csv(input_path, index=False)
+    else:
+        patients.to_parquet(input_path, index=False)
+
+    counts = score_file(input_path, output_path, model=model, chunksize=10)  # 6 chunks, the last one of 3 rows
+
+    scored = pd.read_csv(output_path) if target == "csv" else pd.read_parquet(output_path)
+    pred, flags = expected(registry, patients, model)
+    assert list(scored.columns) == list(patients.columns) + ["Prediction", "RiskBand", "Flags"]
+    assert scored["PatientID"].tolist() == patients["PatientID"].tolist()
+    np.testing.assert_allclose(scored["Prediction"], pred)
+    assert scored["RiskBand"].tolist() == risk_bands(pred).tolist()
+    assert scored["Flags"].tolist() == flags.tolist()
+    assert list(counts) == RISK_BANDS
+    assert counts == scored["RiskBand"].value_counts().reindex(RISK_BANDS, fill_value=0).to_dict()
+
+
+def test_missing_columns_are_refused(registry, patients, tmp_path):
+    input_path = str(tmp_path / "patients.csv")
+    patients.drop(columns="Glucose").to_csv(input_path, index=False)
+    with pytest.raises(ValueError, match="Glucose"):
+        score_file(input_path, str(tmp_path / "predictions.csv"))
+
+
+def test_command_line(registry, patients, tmp_path, capsys):
+    input_path = str(tmp_path / "patients.csv")
+    patients.to_csv(input_path, index=False)
+    main([input_path, str(tmp_path / "predictions.csv"), "--model", "manual", "--chunksize", "7"])
+
+    printed = capsys.readouterr().out.splitlines()
+    assert [line.split(":")[0] for line in printed] == RISK_BANDS
+    assert sum(int(line.split(": ")[1]) for line in printed) == len(patients)
@@ -0,0 +1,115 @@
+"""Many sessions of the prediction pages at once, each with its own input: every session must render
+its own values and nothing else, and running more sessions must not leave files or sockets open.
+
+AppTest swaps streamlit's global runtime on every run, so it can't run sessions on several threads of
+one process. The sessions run in parallel worker processes instead, sharing the dataset, models and
+report cache on disk, and every worker interleaves several sessions so they share its memory too."""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from conftest import ROOT, folder_registry, write_reports
+from model_registry import FEATURES, MANUAL_FEATURES
+from report_cache import ReportCache
+from report_ingest import score_reports
+
+WORKERS = 4
+SESSIONS_PER_WORKER = 3
+ROUNDS = 3  # after a first round that trains the models and imports everything the pages need
+
+
+def open_files():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def manual_input(i):
+    return [i % 15, 100 + i, 60 + i, 20 + i, 25 + i]
+
+
+def report_input(i):
+    return [float(i % 15), 100.0 + i, 60.0 + i, 20.0 + i, 80.0 + i, 25.0 + i, 0.5, 30.0 + i]
+
+
+def reports_folder(folder, i):
+    return os.path.join(folder, "reports", f"session-{i}")
+
+
+def run_sessions(folder, sessions):
+    """Runs in a worker process: opens both pages for every session, enters each session's own input
+    and returns, for every round, the values every session rendered and the number of open files"""
+    from streamlit.testing.v1 import AppTest
+
+    import report_ingest
+    import tenants
+    from report_cache import report_cache
+
+    os.chdir(ROOT)  # the pages read main.css from the project folder
+    tenants.tenants = tenants.TenantCache(hospitals_dir=os.path.join(folder, "hospitals"),
+                                          default=folder_registry(folder))
+    report_ingest.REPORTS_ROOT = folder
+    report_cache.directory = os.path.join(folder, "report_cache")
+
+    rounds = []
+    for _ in range(ROUNDS + 1):
+        manual = [AppTest.from_file(os.path.join(ROOT, "pages", "Manual_Prediction.py"), default_timeout=120)
+                  for _ in sessions]
+        automatic = [AppTest.from_file(os.path.join(ROOT, "pages", "Automatic_Prediction.py"), default_timeout=120)
+                     for _ in sessions]
+        for at in manual + automatic:
+            at.run()
+
+        # every session enters its input before any of them is run again
+        for i, at in zip(sessions, manual):
+            for number_input, value in zip(at.number_input, manual_input(i)):
+                number_input.set_value(value)
+        for i, at in zip(sessions, automatic):
+            at.text_input[0].set_value(reports_folder(folder, i))
+            next(button for button in at.button if button.label == "Read folder").click()
+        for at in manual + automatic:
+            at.run()
+
+        rendered = {}
+        for i, at_manual, at_automatic in zip(sessions, manual, automatic):
+            errors = [error.message for error in list(at_manual.exception) + list(at_automatic.exception)]
+            assert not errors, errors
+            reports = at_automatic.dataframe[0].value
+            rendered[i] = (at_manual.dataframe[0].value[MANUAL_FEATURES].iloc[0].tolist(),
+                           {name: reports.loc[name, FEATURES + ["Prediction"]].tolist() for name in reports.index})
+        rounds.append((rendered, open_files()))
+    return rounds
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="counts the open files with /proc")
+def test_sessions_see_only_their_own_input_and_leak_nothing(tmp_path):
+    folder = str(tmp_path)
+    folder_registry(folder)  # copies the dataset once, before the workers share it
+    os.makedirs(os.path.join(folder, "report_cache"))
+
+    cache = ReportCache(directory=os.path.join(folder, "report_cache"))
+    sessions = list(range(WORKERS * SESSIONS_PER_WORKER))
+    for i in sessions:
+        write_reports(reports_folder(folder, i), {f"patient-{i}.pdf": report_input(i)}, cache)
+
+    with ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(run_sessions, folder, sessions[w::WORKERS]) for w in range(WORKERS)]
+        results = [future.result() for future in futures]
+
+    # the prediction every session should see for its own report
+    scored = score_reports([(f"patient-{i}.pdf", report_input(i), None) for i in sessions],
+                           model_registry=folder_registry(folder))
+
+    for w, rounds in enumerate(results):
+        for rendered, _ in rounds:
+            assert sorted(rendered) == sessions[w::WORKERS]
+            for i, (manual, automatic) in rendered.items():
+                name = f"patient-{i}.pdf"
+                assert manual == manual_input(i)
+                assert list(automatic) == [name]
+                assert automatic[name][:-1] == report_input(i)
+                assert automatic[name][-1] == pytest.approx(scored.loc[name, "Prediction"])
+
+        # the first round opens the files that stay open, such as the memory-mapped dataset
+        files = [count for _, count in rounds]
+        assert max(files[1:]) <= files[0], files
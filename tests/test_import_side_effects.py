@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+from report_cache import ReportCache
+from training_store import TrainingStore
+
+# modules imported by the pages, the CLIs, the service and every PDF extraction worker
+MODULES = ["model_registry", "report_ingest", "report_watcher", "prediction_service", "prediction_cache",
+           "tenants", "evaluation", "batch_predict"]
+
+
+def test_importing_writes_nothing_to_the_current_folder(tmp_path):
+    env = {name: value for name, value in os.environ.items() if name != "REPORT_CACHE_DIR"}
+    subprocess.run([sys.executable, "-c", f"import {', '.join(MODULES)}"], cwd=tmp_path, check=True,
+                   env=dict(env, PYTHONPATH=ROOT))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_store_is_created_on_first_use(tmp_path):
+    store = TrainingStore(str(tmp_path / "contributions.db"))
+    assert not (tmp_path / "contributions.db").exists()
+
+    assert len(store) == 0
+    assert store.add_rows([[1, 100, 70, 20, 80, 30, 0.5, 40, 1]]) == 1
+    assert store.last_id() == 1
+
+
+def test_report_cache_folder_is_created_on_first_write(tmp_path):
+    cache = ReportCache(directory=str(tmp_path / "cache"))
+    assert cache.get("abc") is None
+    assert not (tmp_path / "cache").exists()
+
+    cache.put("abc", [1.0, 2.0])
+    cache.clear()
+    assert cache.get("abc") == [1.0, 2.0]  # read back from the folder
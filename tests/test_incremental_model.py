@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from conftest import folder_registry
+from incremental_model import IncrementalLinearRegression
+from model_registry import FEATURES, TARGET, train_models
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 200, size=(1000, len(FEATURES)))
+    y = (X @ rng.normal(size=len(FEATURES)) + rng.normal(size=len(X)) > 0).astype(float)
+    return X, y
+
+
+def test_partial_fit_batches_match_a_full_refit(dataset):
+    X, y = dataset
+    clf = IncrementalLinearRegression()
+    for batch in np.array_split(np.arange(len(X)), 7):  # uneven batches, the last ones a row shorter
+        clf.partial_fit(X[batch], y[batch])
+
+    full = LinearRegression().fit(X, y)
+    assert clf.n_samples_ == len(X)
+    np.testing.assert_allclose(clf.coef_, full.coef_, rtol=1e-8, atol=1e-10)
+    assert clf.intercept_ == pytest.approx(full.intercept_, rel=1e-8)
+    np.testing.assert_allclose(clf.predict(X), full.predict(X), atol=1e-10)
+
+
+def test_fit_starts_again_from_scratch(dataset):
+    X, y = dataset
+    clf = IncrementalLinearRegression().partial_fit(X[:500], y[:500])
+    clf.fit(X[500:], y[500:])
+
+    full = LinearRegression().fit(X[500:], y[500:])
+    assert clf.n_samples_ == 500
+    np.testing.assert_allclose(clf.coef_, full.coef_, rtol=1e-8, atol=1e-10)
+
+
+def test_partial_fit_refuses_a_different_number_of_features(dataset):
+    X, y = dataset
+    clf = IncrementalLinearRegression().partial_fit(X, y)
+    with pytest.raises(ValueError):
+        clf.partial_fit(X[:, :3], y)
+
+
+def coefficients(models):
+    return {name: clf.coef_.copy() for name, clf in models.items()}
+
+
+def test_rollback_keeps_the_previous_version_until_resume(tmp_path):
+    registry = folder_registry(str(tmp_path))
+    first = coefficients(registry.load())
+    assert registry.version == 1
+
+    rows = pd.read_csv(registry.dataset_path).head(20)
+    registry.store.add_rows(rows[FEATURES + [TARGET]].to_numpy().tolist())
+    updated = coefficients(registry.load())
+    assert registry.version == 2
+    assert not np.allclose(updated["automatic"], first["automatic"])
+
+    assert registry.rollback() == 1
+    assert registry.pinned
+    for name, coef in coefficients(registry.load()).items():
+        np.testing.assert_array_equal(coef, first[name])
+
+    # rows contributed while rolled back are kept but not used
+    registry.store.add_rows(rows.tail(5)[FEATURES + [TARGET]].assign(Age=70).to_numpy().tolist())
+    registry.load()
+    assert registry.version == 1
+
+    registry.resume()
+    resumed = coefficients(registry.load())
+    assert registry.version == 3  # version numbers are never reused
+    assert not registry.pinned
+    assert not np.allclose(resumed["automatic"], updated["automatic"])
+
+    # updated with every row contributed since version 2, the same as training on the whole dataset again
+    refit = train_models(registry.read_dataset(), "linear", registry.feature_medians())
+    for name, coef in resumed.items():
+        np.testing.assert_allclose(coef, refit[name].coef_, rtol=1e-6, atol=1e-9)
+
+
+def test_rollback_without_a_previous_version(tmp_path):
+    registry = folder_registry(str(tmp_path))
+    registry.load()
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+def test_snapshot_returns_the_medians_of_its_version(tmp_path):
+    registry = folder_registry(str(tmp_path))
+    version, models, medians = registry.snapshot()
+    assert version == 1 and models is registry.models
+
+    # a changed CSV file retrains the models from scratch, with new medians
+    df = pd.read_csv(registry.dataset_path)
+    pd.concat([df, df.assign(Glucose=199, BMI=50.0)]).to_csv(registry.dataset_path, index=False)
+    version, _, retrained = registry.snapshot()
+    assert version == 2
+    assert retrained["Glucose"] > medians["Glucose"]
+
+    registry.rollback()
+    version, models, rolled_back = registry.snapshot()
+    assert version == 1
+    assert rolled_back == medians
+    np.testing.assert_array_equal(models["manual"].coef_, registry.get("manual").coef_)
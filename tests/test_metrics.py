@@ -0,0 +1,54 @@
+import cProfile
+import threading
+
+import metrics as metrics_module
+from metrics import Metrics
+
+
+def profiles(folder):
+    return sorted(path.name.split("-")[0] for path in folder.iterdir())
+
+
+def test_only_one_thread_is_profiled_at_a_time(tmp_path):
+    metrics = Metrics(enabled=True, profile_dir=str(tmp_path))
+    entered, done = threading.Event(), threading.Event()
+
+    def first():
+        with metrics.timed("first"):
+            entered.set()
+            done.wait(10)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    entered.wait(10)
+    try:
+        with metrics.timed("second") as timer:  # timed, but not profiled while the first thread is
+            assert timer.profile is None
+    finally:
+        done.set()
+        thread.join()
+
+    with metrics.timed("third") as timer:
+        assert timer.profile is not None
+    histograms, _, _ = metrics.snapshot()
+    assert sorted(histograms) == ["first", "second", "third"]
+    assert profiles(tmp_path) == ["first", "third"]
+
+
+class BusyProfile(cProfile.Profile):
+    """Profiler refused the way Python 3.12 refuses a second one"""
+
+    def enable(self, *args, **kwargs):
+        raise ValueError("Another profiling tool is already active")
+
+
+def test_a_refused_profiler_is_tried_again_on_the_next_stage(tmp_path, monkeypatch):
+    metrics = Metrics(enabled=True, profile_dir=str(tmp_path))
+    monkeypatch.setattr(metrics_module.cProfile, "Profile", BusyProfile)
+    with metrics.timed("refused") as timer:
+        assert timer.profile is None
+
+    monkeypatch.undo()
+    with metrics.timed("profiled") as timer:
+        assert timer.profile is not None
+    assert profiles(tmp_path) == ["profiled"]
@@ -0,0 +1,84 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT, folder_registry
+from model_backends import make_model
+from model_registry import DATASET_PATH, FEATURES, MANUAL_FEATURES, TARGET
+from prediction_cache import INPUT_RANGES, ContributionTable, PredictionCache
+
+PATIENTS = [
+    [1, 120, 70, 30, 40],  # whole numbers inside INPUT_RANGES, read from the tables
+    [min(r) for r in INPUT_RANGES.values()],  # the bounds of the ranges
+    [max(r) for r in INPUT_RANGES.values()],
+    [2, 99.5, 64.25, 31.7, 45],  # decimals, multiplied out
+    [18, 250, 210, 120, 110],  # outside of the ranges, multiplied out
+]
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    df = pd.read_csv(os.path.join(ROOT, DATASET_PATH))
+    return df[MANUAL_FEATURES].to_numpy(dtype=float), df[TARGET].to_numpy(dtype=float)
+
+
+@pytest.mark.parametrize("backend", ["linear", "numpy"])
+@pytest.mark.parametrize("patient", PATIENTS)
+def test_table_predicts_the_same_as_the_model(dataset, backend, patient):
+    clf = make_model(backend).fit(*dataset)
+    table = ContributionTable(clf, MANUAL_FEATURES)
+
+    pred, contributions = table.predict(patient)
+    assert pred == pytest.approx(float(clf.predict([patient])[0]), rel=1e-9, abs=1e-12)
+    assert contributions == pytest.approx([coef * value for coef, value in zip(clf.coef_, patient)])
+
+
+def row(values, outcome):
+    return dict(zip(FEATURES + [TARGET], values + [outcome]))
+
+
+def test_entries_are_dropped_when_the_version_changes(tmp_path):
+    registry = folder_registry(str(tmp_path))
+    cache = PredictionCache()
+    patient = PATIENTS[0]
+
+    first = cache.predict(registry, "manual", patient)
+    assert cache.predict(registry, "manual", patient) is first
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    # a contributed row updates the models, the cached prediction belongs to the previous version
+    registry.store.add_rows([row([i, 180, 90, 40, 200, 45, 1.5, 60], 1) for i in range(10)])
+    updated = cache.predict(registry, "manual", patient)
+    assert registry.version == 2
+    assert updated is not first
+    assert updated["prediction"] != pytest.approx(first["prediction"])
+    assert updated["prediction"] == pytest.approx(float(registry.get("manual").predict([patient])[0]))
+    assert cache.stats()["entries"] == 1
+
+    # and after a rollback the previous version is predicted again, not the cached one
+    registry.rollback()
+    rolled_back = cache.predict(registry, "manual", patient)
+    assert rolled_back is not updated
+    assert rolled_back["prediction"] == pytest.approx(first["prediction"])
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 1}
+
+
+def test_hospitals_with_the_same_version_share_nothing(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    a = folder_registry(str(tmp_path / "a"))
+    b = folder_registry(str(tmp_path / "b"))
+    df = pd.read_csv(b.dataset_path)
+    df.assign(Outcome=1 - df[TARGET]).to_csv(b.dataset_path, index=False)  # a very different hospital
+
+    cache = PredictionCache()
+    patient = PATIENTS[0]
+    from_a = cache.predict(a, "manual", patient)
+    from_b = cache.predict(b, "manual", patient)
+
+    assert a.version == b.version == 1
+    assert cache.stats() == {"hits": 0, "misses": 2, "entries": 2}
+    assert from_a["prediction"] == pytest.approx(float(a.get("manual").predict([patient])[0]))
+    assert from_b["prediction"] == pytest.approx(float(b.get("manual").predict([patient])[0]))
+    assert from_a["prediction"] != pytest.approx(from_b["prediction"])
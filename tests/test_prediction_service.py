@@ -0,0 +1,120 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from model_registry import FEATURES, MANUAL_FEATURES
+from prediction_service import MAX_BODY_BYTES, PredictionService
+from preprocessing import FLAG_IMPUTED, preprocess
+from risk_bands import risk_band
+
+PATIENT = {"Pregnancies": 2, "Glucose": 138, "BloodPressure": 62, "SkinThickness": 35, "Insulin": 90,
+           "BMI": 33.6, "DiabetesPedigreeFunction": 0.127, "Age": 47}
+
+
+def call(service, requests):
+    """Sends the (method, path, keyword arguments) requests to the service at the same time, through an
+    in-process client. Returns the responses in the same order and the number of batches every batcher
+    predicted, read before the service is closed."""
+    async def send_all():
+        transport = httpx.ASGITransport(app=service)
+        async with httpx.AsyncClient(transport=transport, base_url="http://service") as client:
+            try:
+                responses = await asyncio.gather(*(client.request(method, path, **kwargs)
+                                                   for method, path, kwargs in requests))
+                return responses, {key: batcher.batches for key, batcher in service.batchers.items()}
+            finally:
+                await service.close()
+
+    return asyncio.run(send_all())
+
+
+def expected(registry, model, values):
+    cols = FEATURES if model == "automatic" else MANUAL_FEATURES
+    X, _, flags = preprocess([values], cols, registry.feature_medians())
+    return float(registry.get(model).predict(X)[0]), int(flags[0])
+
+
+@pytest.fixture
+def service(registry):
+    return PredictionService(workers=2)
+
+
+def test_health(registry, service):
+    [response], _ = call(service, [("GET", "/health", {})])
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "hospital": "default", "model_version": registry.version,
+                               "model_backend": registry.backend}
+
+
+def test_predict_manual(registry, service):
+    patient = {col: PATIENT[col] for col in MANUAL_FEATURES}
+    (one, many), _ = call(service, [("POST", "/predict/manual", {"json": patient}),
+                                    ("POST", "/predict/manual", {"json": [list(patient.values()), patient]})])
+
+    assert one.status_code == 200
+    pred, flags = expected(registry, "manual", list(patient.values()))
+    assert one.json()["prediction"] == pytest.approx(pred)
+    assert one.json()["risk_band"] == str(risk_band(pred))
+    assert one.json()["flags"] == flags
+    assert one.json()["model_version"] == registry.version
+    assert many.status_code == 200
+    assert [result["prediction"] for result in many.json()] == pytest.approx([pred, pred])
+
+
+def test_predict_automatic_imputes_missing_values(registry, service):
+    values = [PATIENT[col] for col in FEATURES]
+    values[FEATURES.index("Insulin")] = 0  # not measured
+    [response], _ = call(service, [("POST", "/predict/automatic", {"json": values})])
+
+    assert response.status_code == 200
+    pred, flags = expected(registry, "automatic", values)
+    assert flags & FLAG_IMPUTED
+    assert response.json()["prediction"] == pytest.approx(pred)
+    assert response.json()["flags"] == flags
+
+
+def test_predict_report_from_the_cache(registry, service, reports, tmp_path):
+    values = [float(PATIENT[col]) for col in FEATURES]
+    reports(str(tmp_path / "reports"), {"report.pdf": values})
+    body = (tmp_path / "reports" / "report.pdf").read_bytes()
+    [response], _ = call(service, [("POST", "/predict/report", {"content": body})])
+
+    assert response.status_code == 200
+    assert response.json()["values"] == dict(zip(FEATURES, values))
+    assert response.json()["prediction"] == pytest.approx(expected(registry, "automatic", values)[0])
+
+
+@pytest.mark.parametrize("method, path, kwargs, status", [
+    ("GET", "/unknown", {}, 404),
+    ("POST", "/health", {}, 405),
+    ("GET", "/predict/manual", {}, 405),
+    ("GET", "/health?hospital=nowhere", {}, 404),
+    ("POST", "/predict/manual", {"content": b"not json"}, 400),
+    ("POST", "/predict/manual", {"json": {"Pregnancies": 1}}, 400),
+    ("POST", "/predict/manual", {"json": [1, 2, 3]}, 400),
+    ("POST", "/predict/manual", {"json": [1, "120", 70, 30, 30]}, 400),
+    ("POST", "/predict/manual", {"json": [1, 0, 70, 30, 30]}, 400),  # a glucose of 0 isn't entered
+    ("POST", "/predict/report", {"content": b""}, 400),
+    ("POST", "/predict/automatic", {"content": b" " * (MAX_BODY_BYTES + 1)}, 413),
+])
+def test_errors(service, method, path, kwargs, status):
+    [response], _ = call(service, [(method, path, kwargs)])
+    assert response.status_code == status
+    assert "error" in response.json()
+
+
+def test_concurrent_requests_are_predicted_in_one_batch(registry):
+    service = PredictionService(workers=2, max_batch_size=64, max_wait_ms=500)
+    rng = np.random.default_rng(0)
+    patients = [[int(rng.integers(0, 10)), int(rng.integers(80, 200)), int(rng.integers(50, 100)),
+                 int(rng.integers(20, 45)), int(rng.integers(21, 70))] for _ in range(32)]
+    registry.load()  # trained before the burst, so the batch doesn't wait for it
+
+    responses, batches = call(service, [("POST", "/predict/manual", {"json": patient}) for patient in patients])
+
+    assert [response.status_code for response in responses] == [200] * len(patients)
+    assert [response.json()["prediction"] for response in responses] == pytest.approx(
+        [expected(registry, "manual", patient)[0] for patient in patients])
+    assert batches == {("default", "manual"): 1}
@@ -0,0 +1,74 @@
+import numpy as np
+
+from model_registry import FEATURES, MANUAL_FEATURES
+from preprocessing import (FLAG_CLIPPED, FLAG_IMPUTED, RANGES, compute_medians, describe_flags, missing_columns,
+                           missing_mask, preprocess)
+
+MEDIANS = {"Pregnancies": 3.0, "Glucose": 117.0, "BloodPressure": 72.0, "SkinThickness": 29.0, "Insulin": 125.0,
+           "BMI": 32.3, "DiabetesPedigreeFunction": 0.37, "Age": 29.0}
+PATIENT = [2, 138, 62, 35, 90, 33.6, 0.127, 47]
+
+
+def test_zeros_are_missing_only_where_zero_means_not_measured():
+    X = [[0, 0, 0, 0, 0, 0, 0, 21]]
+    assert missing_mask(X, FEATURES).tolist() == [[False, True, True, True, True, True, False, False]]
+
+
+def test_nan_is_missing_in_every_column():
+    X = np.full((2, len(FEATURES)), np.nan)
+    X[1] = PATIENT
+    assert missing_mask(X, FEATURES).tolist() == [[True] * len(FEATURES), [False] * len(FEATURES)]
+
+
+def test_missing_columns():
+    assert missing_columns([1, 120, 70, 30, 40], MANUAL_FEATURES) == []
+    assert missing_columns([0, 0, 70, float("nan"), 40], MANUAL_FEATURES) == ["Glucose", "BMI"]
+    assert missing_columns([[1, 120, 70, 30, 40], [1, 120, 0, 30, 40]], MANUAL_FEATURES) == ["BloodPressure"]
+
+
+def test_missing_values_are_replaced_by_the_medians():
+    row = list(PATIENT)
+    row[FEATURES.index("Insulin")] = 0
+    row[FEATURES.index("BMI")] = np.nan
+    X, missing, flags = preprocess([row, PATIENT], FEATURES, MEDIANS)
+
+    assert X[0].tolist() == [2, 138, 62, 35, MEDIANS["Insulin"], MEDIANS["BMI"], 0.127, 47]
+    assert X[1].tolist() == PATIENT
+    assert missing[0].sum() == 2 and not missing[1].any()
+    assert flags.tolist() == [FLAG_IMPUTED, 0]
+
+
+def test_values_are_clipped_to_their_range():
+    X, _, flags = preprocess([[25, 500, 10, 3, 2000, 90, 5.0, 150]], FEATURES, MEDIANS)
+    assert X[0].tolist() == [20, 400, 20, 5, 1000, 80, 3.0, 120]
+    assert flags.tolist() == [FLAG_CLIPPED]
+
+    # the bounds themselves are inside the range
+    bounds = [[RANGES[col][i] for col in FEATURES] for i in (0, 1)]
+    X, _, flags = preprocess(bounds, FEATURES, MEDIANS)
+    assert X.tolist() == bounds
+    assert flags.tolist() == [0, 0]
+
+
+def test_both_flags_and_the_input_is_left_unchanged():
+    row = np.array([[1, 0, 70, 30, 0, 45, 0.5, 18]], dtype=float)
+    X, _, flags = preprocess(row, FEATURES, MEDIANS)
+    assert flags.tolist() == [FLAG_IMPUTED | FLAG_CLIPPED]
+    assert X[0, FEATURES.index("Age")] == RANGES["Age"][0]
+    assert row[0].tolist() == [1, 0, 70, 30, 0, 45, 0.5, 18]
+    assert describe_flags(flags[0]) == "missing values imputed, values clipped to range"
+    assert describe_flags(0) == ""
+
+
+def test_a_single_row_and_a_subset_of_the_columns():
+    X, _, flags = preprocess([1, 120, 0, 30, 40], MANUAL_FEATURES, MEDIANS)
+    assert X.shape == (1, 5)
+    assert X[0].tolist() == [1, 120, MEDIANS["BloodPressure"], 30, 40]
+    assert flags.dtype == np.uint8
+
+
+def test_medians_leave_out_the_zeros_that_mean_missing():
+    columns = {"Pregnancies": np.array([0, 0, 0, 1, 2]), "Glucose": np.array([0, 0, 0, 100, 120]),
+               "Insulin": np.zeros(3)}
+    medians = compute_medians(columns)
+    assert medians == {"Pregnancies": 0.0, "Glucose": 110.0, "Insulin": 0.0}  # only zeros: nothing to go on
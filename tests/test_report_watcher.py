@@ -0,0 +1,146 @@
+import csv
+import shutil
+import threading
+import time
+
+import pytest
+
+import report_watcher
+from metrics import Metrics
+from report_cache import report_key
+from report_ingest import score_reports
+from report_watcher import LEDGER_NAME, OUTPUT_COLUMNS, ReportWatcher
+
+VALUES = {f"patient-{i}.pdf": [float(i), 100.0 + i, 60.0 + i, 20.0 + i, 80.0 + i, 25.0 + i, 0.5, 30.0 + i]
+          for i in range(5)}
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == OUTPUT_COLUMNS
+        return list(reader)
+
+
+def sha_of(path):
+    return report_key(path.read_bytes())
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def folder(tmp_path, reports):
+    reports(str(tmp_path / "incoming"), VALUES)
+    return tmp_path / "incoming"
+
+
+def test_run_once_scores_every_report(registry, folder, tmp_path):
+    output = tmp_path / "results.csv"
+    watcher = ReportWatcher(str(folder), str(output), max_workers=1)
+    watcher.run_once()
+
+    assert watcher.stats()["scored"] == len(VALUES)
+    assert watcher.stats()["failed"] == watcher.stats()["skipped"] == 0
+
+    scored = score_reports([(name, values, None) for name, values in VALUES.items()], model_registry=registry)
+    rows = read_rows(output)
+    assert [row["Report"] for row in rows] == sorted(VALUES)
+    for row in rows:
+        assert row["SHA256"] == sha_of(folder / row["Report"])
+        assert [float(row[col]) for col in OUTPUT_COLUMNS[3:11]] == VALUES[row["Report"]]
+        assert float(row["Prediction"]) == pytest.approx(scored.loc[row["Report"], "Prediction"])
+        assert row["RiskBand"] == str(scored.loc[row["Report"], "RiskBand"])
+        assert row["Error"] == ""
+
+    assert len(watcher.ledger) == len(VALUES)
+    assert all(sha_of(folder / name) in watcher.ledger for name in VALUES)
+    assert (folder / LEDGER_NAME).exists()
+
+
+def test_restart_skips_the_reports_already_scored(registry, folder, reports, tmp_path):
+    output = tmp_path / "results.csv"
+    ReportWatcher(str(folder), str(output), max_workers=1).run_once()
+    first = read_rows(output)
+
+    # a new report, and an old one copied in again under another name
+    reports(str(folder), {"patient-new.pdf": [1.0, 150.0, 70.0, 30.0, 100.0, 35.0, 0.8, 50.0]})
+    shutil.copy(folder / "patient-0.pdf", folder / "patient-0-copy.pdf")
+
+    restarted = ReportWatcher(str(folder), str(output), max_workers=1)
+    restarted.run_once()
+
+    assert restarted.stats()["skipped"] == len(VALUES) + 1
+    assert restarted.stats()["scored"] == 1
+    rows = read_rows(output)
+    assert rows[:len(first)] == first
+    assert [row["Report"] for row in rows[len(first):]] == ["patient-new.pdf"]
+    assert len(restarted.ledger) == len(VALUES) + 1
+
+    # and nothing is left to do on a second pass of the same watcher
+    restarted.run_once()
+    assert restarted.stats()["scored"] == 1
+    assert len(read_rows(output)) == len(VALUES) + 1
+
+
+def test_background_threads_wait_for_room_in_the_queue(registry, reports, tmp_path, monkeypatch):
+    incoming = str(tmp_path / "incoming")
+    reports(incoming, {f"patient-{i:02}.pdf": [float(i % 15), 100.0 + i, 60.0, 20.0, 80.0, 25.0 + i, 0.5, 30.0]
+                       for i in range(12)})
+    metrics = Metrics(enabled=True)
+    monkeypatch.setattr(report_watcher, "metrics", metrics)
+
+    # the extraction is held back until the queue has filled up
+    extracting = threading.Event()
+    go = threading.Event()
+    ingest_reports = report_watcher.ingest_reports
+
+    def held_back(batch, max_workers):
+        extracting.set()
+        go.wait(10)
+        return ingest_reports(batch, max_workers)
+
+    monkeypatch.setattr(report_watcher, "ingest_reports", held_back)
+
+    output = tmp_path / "results.csv"
+    watcher = ReportWatcher(incoming, str(output), max_queue=2, batch_size=2, max_workers=1,
+                            poll_interval=0.05, settle=0)
+    watcher.start()
+    try:
+        assert extracting.wait(10)
+        wait_for(lambda: watcher.stats()["queue_depth"] == 2)
+        time.sleep(0.3)  # time for the scanner to read more reports, if it didn't wait
+
+        stats = watcher.stats()
+        assert stats["queue_depth"] == 2
+        assert stats["scored"] == 0
+        # the batch being extracted, the full queue and the report the scanner waits to queue
+        assert stats["queued"] <= 2 + 2 + 1
+        assert metrics.snapshot()[2]["watcher_queue_depth"] == 2
+
+        go.set()
+        wait_for(lambda: watcher.stats()["scored"] == 12)
+    finally:
+        go.set()
+        watcher.stop(timeout=10)
+
+    assert watcher._threads == []
+    assert not any(thread.name.startswith("report-") for thread in threading.enumerate())
+
+    stats = watcher.stats()
+    assert stats["queued"] == stats["scored"] == 12
+    assert stats["queue_depth"] == stats["failed"] == stats["skipped"] == 0
+    assert stats["throughput"] > 0 and stats["throughput_last_minute"] > 0
+    _, counters, gauges = metrics.snapshot()
+    assert counters[("watcher_scored", None)] == 12
+    assert gauges["watcher_queue_depth"] == 0
+
+    # every report is written once, in batches of at most 2
+    assert sorted(row["Report"] for row in read_rows(output)) == [f"patient-{i:02}.pdf" for i in range(12)]
+    assert len(watcher.ledger) == 12
+    histograms, _, _ = metrics.snapshot()
+    assert sum(histograms["watcher_batch"][0]) >= 6
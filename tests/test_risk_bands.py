@@ -0,0 +1,43 @@
+import math
+
+import numpy as np
+import pytest
+
+from risk_bands import AT_RISK, LIKELY, MOST_LIKELY, UNLIKELY, risk_band, risk_bands
+
+
+def page_band(pred):
+    """The categories of the original prediction pages, which the bands must keep"""
+    if pred >= 0.8:
+        return MOST_LIKELY
+    elif 0.8 > pred >= 0.5:
+        return LIKELY
+    elif 0.5 > pred > 0.3:
+        return AT_RISK
+    return UNLIKELY
+
+
+@pytest.mark.parametrize("pred, band", [
+    (1.2, MOST_LIKELY),
+    (0.8, MOST_LIKELY),
+    (np.nextafter(0.8, 0), LIKELY),
+    (0.5, LIKELY),
+    (np.nextafter(0.5, 0), AT_RISK),
+    (np.nextafter(0.3, 1), AT_RISK),
+    (0.3, UNLIKELY),
+    (0.0, UNLIKELY),
+    (-0.4, UNLIKELY),
+    (math.nan, UNLIKELY),
+])
+def test_boundaries(pred, band):
+    assert risk_band(pred) == band
+    assert page_band(pred) == band
+
+
+def test_same_bands_as_the_pages():
+    preds = np.concatenate([np.linspace(-0.5, 1.5, 2001), [0.3, 0.5, 0.8, math.nan]])
+    assert risk_bands(preds).tolist() == [page_band(pred) for pred in preds]
+
+
+def test_single_prediction_of_a_model():
+    assert risk_band(np.array([0.65])) == LIKELY  # predict() returns an array of one value
@@ -0,0 +1,129 @@
+import math
+import sqlite3
+
+STORE_PATH = "diabetes_contributions.db"
+
+# the nine columns of the dataset, in the same order as diabetes_dataset.csv
+COLUMNS = ["Pregnancies", "Glucose", "BloodPressure", "SkinThickness", "Insulin", "BMI",
+           "DiabetesPedigreeFunction", "Age", "Outcome"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contributions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Pregnancies REAL NOT NULL CHECK (Pregnancies >= 0),
+    Glucose REAL NOT NULL CHECK (Glucose >= 0),
+    BloodPressure REAL NOT NULL CHECK (BloodPressure >= 0),
+    SkinThickness REAL NOT NULL CHECK (SkinThickness >= 0),
+    Insulin REAL NOT NULL CHECK (Insulin >= 0),
+    BMI REAL NOT NULL CHECK (BMI >= 0),
+    DiabetesPedigreeFunction REAL NOT NULL CHECK (DiabetesPedigreeFunction >= 0),
+    Age REAL NOT NULL CHECK (Age >= 0),
+    Outcome INTEGER NOT NULL CHECK (Outcome IN (0, 1)),
+    UNIQUE (Pregnancies, Glucose, BloodPressure, SkinThickness, Insulin, BMI,
+            DiabetesPedigreeFunction, Age, Outcome)
+)
+"""
+
+
+def connect(path):
+    """Function that opens a new connection to the SQLite database at 'path' in WAL mode, so readers never
+    wait for a writer. A connection per call can be used by any thread, e.g. every streamlit session's."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe in WAL mode, a commit is not lost on a crash of the app
+    return conn
+
+
+def validate_row(row):
+    """Function that checks a contributed row against the nine columns and returns it as a tuple of numbers"""
+    if isinstance(row, dict):
+        missing = [col for col in COLUMNS if col not in row]
+        if missing:
+            raise ValueError(f"Row is missing the columns: {', '.join(missing)}")
+        row = [row[col] for col in COLUMNS]
+
+    row = list(row)
+    if len(row) != len(COLUMNS):
+        raise ValueError(f"Expected {len(COLUMNS)} values but got {len(row)}")
+
+    values = []
+    for col, value in zip(COLUMNS, row):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{col} must be a number, got {value!r}") from None
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"{col} must be a non-negative number, got {value}")
+        values.append(value)
+
+    if values[-1] not in (0.0, 1.0):
+        raise ValueError(f"Outcome must be 0 or 1, got {values[-1]:g}")
+    values[-1] = int(values[-1])
+    return tuple(values)
+
+
+class TrainingStore:
+    """Rows contributed by the users to train the model, kept in a SQLite database in WAL mode.
+
+    WAL mode lets the pages read the data while another worker is adding rows, every batch of rows is
+    added in a single transaction and rows that were already contributed are ignored.
+
+    The database file is only created when the store is first used, so creating a store (e.g. when a
+    module holding one is imported) never writes anything to disk."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._created = False  # whether the table was created by this store already
+
+    def _connect(self):
+        conn = connect(self.path)
+        if not self._created:
+            conn.execute(_SCHEMA)  # does nothing if another store or process created it first
+            self._created = True
+        return conn
+
+    def add_rows(self, rows):
+        """Adds a batch of rows atomically and returns how many of them were new.
+        Raises ValueError, without adding anything, if any of the rows is invalid."""
+        values = [validate_row(row) for row in rows]
+        placeholders = ", ".join("?" for _ in COLUMNS)
+
+        conn = self._connect()
+        try:
+            with conn:  # one transaction for the whole batch
+                before = conn.total_changes
+                conn.executemany(f"INSERT OR IGNORE INTO contributions ({', '.join(COLUMNS)}) "
+                                 f"VALUES ({placeholders})", values)
+                return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def load_frame(self, since_id=0, until_id=None):
+        """Returns the contributed rows with an id after 'since_id' and up to 'until_id' (or the last one)
+        as a dataframe with the nine columns"""
+        import pandas as pd
+
+        if until_id is None:
+            until_id = 2 ** 63 - 1  # largest id sqlite can store
+        conn = self._connect()
+        try:
+            data = pd.read_sql_query(f"SELECT {', '.join(COLUMNS)} FROM contributions "
+                                     f"WHERE id > ? AND id <= ? ORDER BY id", conn, params=(since_id, until_id))
+        finally:
+            conn.close()
+        return data.astype({"Outcome": "int64"})
+
+    def last_id(self):
+        """Returns the id of the last contributed row, it only changes when rows are added"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM contributions").fetchone()[0]
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM contributions").fetchone()[0]
+        finally:
+            conn.close()